@@ -1,3 +1,7 @@
+import functools
+
+import numpy as np
+
 def _binary_repr(num, width):
     """Return a binary string representation of `num` with zero padded to `width` bits."""
     return format(num, 'b').zfill(width)
@@ -101,4 +105,231 @@ def coordinates_to_distance(x, bits, ndim):
         x[i] ^= t
 
     l = _transpose_to_hilbert_integer(x, bits, ndim)
-    return l
\ No newline at end of file
+    return l
+
+def _check_batch_width(bits, ndim):
+    if bits * ndim > 64:
+        raise ValueError("Hilbert distances of bits*ndim =", bits * ndim, "bits do not fit in uint64")
+
+
+def _check_coordinate_width(bits):
+    if bits > 64:
+        raise ValueError("Coordinates of bits =", bits, "bits do not fit in uint64")
+
+
+def n_words(bits, ndim):
+    """Return the number of uint64 words of a Hilbert key with `bits` * `ndim` bits."""
+    return max(1, -(-bits * ndim // 64))
+
+
+def _uint(nbits):
+    """Return the narrowest unsigned integer dtype holding `nbits` bits."""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if nbits <= 8 * np.dtype(dtype).itemsize:
+            return np.dtype(dtype)
+
+
+@functools.lru_cache(maxsize=None)
+def _byte_tables(bits, ndim):
+    """Return lookup tables moving the bits of each byte of a Hilbert key to its transpose and back.
+    to_x[k, i, v]: bits of x[i] set by value v of byte k (least significant first) of l.
+    to_l[i, k, v, w]: bits of word w (most significant first) of l set by value v of byte k of x[i].
+    Also return the (i) touched by each byte of l and the (w) touched by each byte of x[i], so empty tables
+    are skipped.
+    """
+    words  = n_words(bits, ndim)
+    values = np.arange(256, dtype=np.uint64)
+    to_x   = np.zeros(((bits * ndim + 7) // 8, ndim, 256), dtype=_uint(bits))
+    to_l   = np.zeros((ndim, (bits + 7) // 8, 256, words), dtype=np.uint64)
+    for q in range(bits * ndim):    # bit q of l (least significant first) is bit q // ndim of x[ndim-1 - q % ndim]
+        i, r = ndim - 1 - q % ndim, q // ndim
+        to_x[q // 8, i] |= (((values >> np.uint64(q % 8)) & np.uint64(1)) << np.uint64(r)).astype(to_x.dtype)
+        to_l[i, r // 8, :, words - 1 - q // 64] |= ((values >> np.uint64(r % 8)) & np.uint64(1)) << np.uint64(q % 64)
+    x_touched = [np.flatnonzero(to_x[k].any(axis=1)).tolist() for k in range(len(to_x))]
+    l_touched = [[np.flatnonzero(to_l[i, k].any(axis=0)).tolist() for k in range(to_l.shape[1])] for i in range(ndim)]
+    return to_x, to_l, x_touched, l_touched
+
+
+def _hilbert_integers_to_transpose(l, bits, ndim):
+    """Store Hilbert keys (`l`) as their transposes (`x`) with array bit operations.
+    :param l: integer distances along Hilbert curve, as uint64 or as multi-word keys
+    :type l: ``numpy.ndarray`` of ``uint64``, shape (n,) or (n, words)
+    :return: ``numpy.ndarray`` of the narrowest unsigned type holding `bits` bits, shape (ndim, n)
+    """
+    to_x, _, x_touched, _ = _byte_tables(bits, ndim)
+    l       = np.asarray(l, dtype=np.uint64).reshape(len(l), -1)
+    nbytes  = 8 * l.shape[1]
+    l_bytes = np.ascontiguousarray(np.ascontiguousarray(l, dtype='>u8').view(np.uint8).reshape(len(l), nbytes).T)
+    x = np.zeros((ndim, len(l)), dtype=_uint(bits))
+    for k in range(min(len(to_x), nbytes)):
+        for i in x_touched[k]:
+            x[i] |= to_x[k, i].take(l_bytes[nbytes - 1 - k])
+    return x
+
+
+def _transpose_to_hilbert_integers(x, bits, ndim):
+    """Restore Hilbert keys (`l`) from their transposes (`x`) with array bit operations.
+    :param x: the transposes of Hilbert integers (ndim components of length bits)
+    :type x: ``numpy.ndarray`` of unsigned ``int``, shape (ndim, n)
+    :return: ``numpy.ndarray`` of ``uint64``, shape (n, words), most significant word first
+    """
+    _, to_l, _, l_touched = _byte_tables(bits, ndim)
+    x_bytes = np.ascontiguousarray(x, dtype=x.dtype.newbyteorder('<')).view(np.uint8).reshape(ndim, x.shape[1], -1)
+    l = np.zeros((to_l.shape[-1], x.shape[1]), dtype=np.uint64)
+    for i in range(ndim):
+        for k in range(to_l.shape[1]):
+            x_byte = np.ascontiguousarray(x_bytes[i, :, k])
+            for w in l_touched[i][k]:
+                l[w] |= to_l[i, k, :, w].take(x_byte)
+    return np.ascontiguousarray(l.T)
+
+
+def _undo_excess_work(x, bits, ndim):
+    """Batch of the 'undo excess work' loop of `distance_to_coordinates`, in place on `x` (ndim, n)."""
+    one = x.dtype.type(1)
+    Q = 2
+    while Q != 2 << (bits-1):
+        P, q = x.dtype.type(Q - 1), x.dtype.type(Q.bit_length() - 1)
+        for i in range(ndim-1, -1, -1):
+            invert = (x[i] >> q) & one    # 1 where x[i] & Q
+            x[0] ^= invert * P
+            t = ((x[0] ^ x[i]) & P) * (one - invert)    # exchange
+            x[0] ^= t
+            x[i] ^= t
+        Q <<= 1
+
+
+def _inverse_undo_excess_work(x, bits, ndim):
+    """Batch of the 'inverse undo excess work' loop of `coordinates_to_distance`, in place on `x` (ndim, n)."""
+    one = x.dtype.type(1)
+    Q = 1 << (bits - 1)
+    while Q > 1:
+        P, q = x.dtype.type(Q - 1), x.dtype.type(Q.bit_length() - 1)
+        for i in range(ndim):
+            invert = (x[i] >> q) & one    # 1 where x[i] & Q
+            x[0] ^= invert * P
+            t = ((x[0] ^ x[i]) & P) * (one - invert)    # exchange
+            x[0] ^= t
+            x[i] ^= t
+        Q >>= 1
+
+
+def _gray_decode(x, ndim):
+    """Gray decode by H ^ (H/2), in place on `x` (ndim, n)."""
+    t = x[ndim-1] >> x.dtype.type(1)
+    for i in range(ndim-1, 0, -1):
+        x[i] ^= x[i-1]
+    x[0] ^= t
+
+
+def _gray_encode(x, bits, ndim):
+    """Gray encode, in place on `x` (ndim, n)."""
+    for i in range(1, ndim):
+        x[i] ^= x[i-1]
+    t = np.zeros(x.shape[1], dtype=x.dtype)
+    Q = 1 << (bits - 1)
+    while Q > 1:
+        t ^= ((x[ndim-1] >> x.dtype.type(Q.bit_length() - 1)) & x.dtype.type(1)) * x.dtype.type(Q - 1)
+        Q >>= 1
+    x ^= t
+
+
+def keys_to_coordinates(keys, bits, ndim):
+    """Return the coordinates for an array of multi-word Hilbert keys, for any bits * ndim.
+    :param keys: distances along the curve, ``n_words(bits, ndim)`` uint64 words each, most significant first
+    :type keys: array_like of ``uint64``, shape (n, words)
+    :param bits: side length of hyper-cube is 2^bits
+    :type bits: ``int``
+    :param ndim: number of dimensions
+    :type ndim: ``int``
+    :return: ``numpy.ndarray`` of ``uint64``, shape (n, ndim)
+    """
+    _check_coordinate_width(bits)
+    x = _hilbert_integers_to_transpose(np.asarray(keys, dtype=np.uint64).reshape(-1, n_words(bits, ndim)), bits, ndim)
+    _gray_decode(x, ndim)
+    _undo_excess_work(x, bits, ndim)
+    return x.T.astype(np.uint64)
+
+
+def coordinates_to_keys(x, bits, ndim):
+    """Return the multi-word Hilbert keys for an array of coordinates, for any bits * ndim.
+    :param x: coordinates, one point per row
+    :type x: array_like of ``int``, shape (n, ndim)
+    :param bits: side length of hyper-cube is 2^bits
+    :type bits: ``int``
+    :param ndim: number of dimensions
+    :type ndim: ``int``
+    :return: ``numpy.ndarray`` of ``uint64``, shape (n, words), most significant word first
+    """
+    _check_coordinate_width(bits)
+    x = np.ascontiguousarray(np.asarray(x).reshape(-1, ndim).T, dtype=_uint(bits))
+    _inverse_undo_excess_work(x, bits, ndim)
+    _gray_encode(x, bits, ndim)
+    return _transpose_to_hilbert_integers(x, bits, ndim)
+
+
+def distances_to_coordinates(l, bits, ndim):
+    """Return the coordinates for an array of Hilbert distances; batch version of `distance_to_coordinates`.
+    :param l: integer distances along the curve, bits * ndim <= 64
+    :type l: array_like of ``uint64``, shape (n,)
+    :param bits: side length of hyper-cube is 2^bits
+    :type bits: ``int``
+    :param ndim: number of dimensions
+    :type ndim: ``int``
+    :return: ``numpy.ndarray`` of ``uint64``, shape (n, ndim)
+    """
+    _check_batch_width(bits, ndim)
+    return keys_to_coordinates(np.asarray(l, dtype=np.uint64).reshape(-1, 1), bits, ndim)
+
+
+def coordinates_to_distances(x, bits, ndim):
+    """Return the Hilbert distances for an array of coordinates; batch version of `coordinates_to_distance`.
+    :param x: coordinates, one point per row, bits * ndim <= 64
+    :type x: array_like of ``int``, shape (n, ndim)
+    :param bits: side length of hyper-cube is 2^bits
+    :type bits: ``int``
+    :param ndim: number of dimensions
+    :type ndim: ``int``
+    :return: ``numpy.ndarray`` of ``uint64``, shape (n,)
+    """
+    _check_batch_width(bits, ndim)
+    return coordinates_to_keys(x, bits, ndim)[:, 0]
+
+
+def ints_to_keys(l, bits, ndim):
+    """Return Python integer distances as multi-word keys, shape (n, words)."""
+    words = n_words(bits, ndim)
+    data  = b''.join(int(k).to_bytes(8 * words, 'big') for k in l)
+    return np.frombuffer(data, dtype='>u8').astype(np.uint64).reshape(-1, words)
+
+
+def keys_to_ints(keys):
+    """Return multi-word keys (n, words) as a list of Python integer distances."""
+    keys = np.ascontiguousarray(keys, dtype='>u8')
+    return [int.from_bytes(row.tobytes(), 'big') for row in keys.reshape(len(keys), -1)]
+
+
+def sortable(keys):
+    """Return multi-word keys (n, words) as a (n,) array of fixed-width big-endian byte strings, which
+    compare, sort and bisect in the order of the distances they encode.
+    Trailing zero bytes are dropped by numpy on comparison, which does not change the order of equal-width strings.
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    keys = np.ascontiguousarray(keys.reshape(len(keys), -1), dtype='>u8')
+    return keys.view('S%d' % (8 * keys.shape[1])).reshape(len(keys))
+
+
+def compare_keys(a, b):
+    """Return -1, 0 or 1 where the keys of `a` are less than, equal to or greater than those of `b` (broadcast)."""
+    a, b = sortable(a), sortable(b)
+    return (a > b).astype(np.int8) - (a < b).astype(np.int8)
+
+
+def argsort_keys(keys):
+    """Return the indices that sort multi-word keys (n, words) by distance along the curve (stable)."""
+    return np.argsort(sortable(keys), kind='stable')
+
+
+def searchsorted_keys(sorted_keys, keys, side='left'):
+    """Return the insertion points of `keys` into `sorted_keys` (both (n, words)) keeping them in order."""
+    return np.searchsorted(sortable(sorted_keys), sortable(keys), side=side)
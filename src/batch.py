@@ -0,0 +1,107 @@
+import collections
+import csv
+import multiprocessing
+import time
+import traceback
+
+import numpy as np
+
+from direct import Direct, GlobalMin
+
+
+Job = collections.namedtuple('Job', 'name f bounds globalmin params cost')
+
+Result = collections.namedtuple('Result', 'job name curr_opt x_at_opt n_feval n_iter n_rectdiv wall_time error')
+
+DEFAULTS = {'max_feval': 200, 'max_rectdiv': 100}    # those of Direct
+
+
+def job(name, f, bounds, globalmin=GlobalMin(), cost=None, **params):
+    """Return the Job of minimizing (or maximizing, see GlobalMin) `f` within `bounds`.
+    :param f: objective, picklable to run in a process pool (a module level function or a functools.partial)
+    :param cost: relative cost of the job, estimated by `estimate_cost` if not given
+    :param params: further Direct arguments
+    """
+    return Job(name, f, np.asarray(bounds, dtype=float), globalmin, params, cost)
+
+
+def estimate_cost(job):
+    """Return the relative cost of `job`: its evaluation budget, times its dimension for the division work.
+    A known optimum makes Direct run until it is reached whatever the budget, which still ranks the jobs.
+    """
+    if job.cost is not None:
+        return job.cost
+    budget = min(job.params.get('max_feval', DEFAULTS['max_feval']),
+                 2 * job.params.get('max_rectdiv', DEFAULTS['max_rectdiv']))    # 2 evaluations per rectdiv
+    return budget * len(job.bounds)
+
+
+def run_job(index, job):
+    """Run `job` and return its Result, `index` being its position in the batch. An exception raised by
+    the objective or Direct ends the job only: it is reported in `error`, with curr_opt NaN.
+    """
+    start = time.perf_counter()
+    try:
+        d = Direct(job.f, job.bounds, globalmin=job.globalmin, **job.params)
+        for _ in d.iterate():
+            pass
+    except Exception:
+        return Result(index, job.name, np.nan, np.full(len(job.bounds), np.nan), 0, 0, 0,
+                      time.perf_counter() - start, traceback.format_exc(limit=-1).strip())
+    return Result(index, job.name, float(d.true_sign(d.curr_opt)), np.asarray(d.x_at_opt, dtype=float),
+                  d.n_feval, d.n_iter, d.n_rectdiv, time.perf_counter() - start, None)
+
+
+def _run_job(args):
+    return run_job(*args)
+
+
+def run_batch(jobs, processes=None, context=None):
+    """Run the `jobs` across a pool of `processes` (by default one per CPU) and yield their Results as
+    each one finishes. The jobs are handed out one at a time, the most costly first (see `estimate_cost`),
+    so that no long job starts last while the other processes idle.
+    :param processes: 0 runs the jobs in this process, in the same order
+    :param context: multiprocessing start method, e.g. 'spawn'; the platform default if None
+    """
+    jobs  = list(jobs)
+    order = sorted(range(len(jobs)), key=lambda i: -estimate_cost(jobs[i]))
+    tasks = [(i, jobs[i]) for i in order]
+    if processes == 0:
+        for task in tasks:
+            yield run_job(*task)
+        return
+    with multiprocessing.get_context(context).Pool(processes) as pool:
+        for result in pool.imap_unordered(_run_job, tasks, chunksize=1):
+            yield result
+
+
+def result_table(results):
+    """Return the `results` as a structured array with one row per job, sorted by job index. x_at_opt is
+    padded with NaN to the largest dimension of the batch.
+    """
+    results = sorted(results, key=lambda result: result.job)
+    ndim    = max((len(result.x_at_opt) for result in results), default=0)
+    width   = max((len(result.name) for result in results if result.name), default=1)
+    table   = np.zeros(len(results), dtype=[('job', np.int64), ('name', 'U%d' % width),
+                                            ('curr_opt', np.float64), ('x_at_opt', np.float64, (ndim,)),
+                                            ('n_feval', np.int64), ('n_iter', np.int64),
+                                            ('n_rectdiv', np.int64), ('wall_time', np.float64), ('ok', bool)])
+    table['x_at_opt'] = np.nan
+    for row, result in zip(table, results):
+        row['job'], row['name'], row['curr_opt'] = result.job, result.name or '', result.curr_opt
+        row['x_at_opt'][:len(result.x_at_opt)] = result.x_at_opt
+        row['n_feval'], row['n_iter'], row['n_rectdiv'] = result.n_feval, result.n_iter, result.n_rectdiv
+        row['wall_time'], row['ok'] = result.wall_time, result.error is None
+    return table
+
+
+def write_csv(table, path):
+    """Write a `result_table` to `path`, one column per coordinate of x_at_opt."""
+    ndim   = table['x_at_opt'].shape[1]
+    fields = [name for name in table.dtype.names if name != 'x_at_opt']
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(fields[:3] + ['x%d' % k for k in range(ndim)] + fields[3:])
+        for row in table:
+            writer.writerow([row[name].item() for name in fields[:3]] + row['x_at_opt'].tolist()
+                            + [row[name].item() for name in fields[3:]])
@@ -0,0 +1,228 @@
+import argparse
+import collections
+import contextlib
+import csv
+import functools
+import io
+import json
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+from direct import (AllLongestSides, Direct, GlobalMin, LocallyBiasedSelection, NelderMead, OneLongestSide,
+                    OriginalSelection, PatternSearch)
+from helper import *
+
+try:
+    import resource
+except ImportError:    # not on Windows; peak RSS is then not reported
+    resource = None
+
+
+Case = collections.namedtuple('Case', 'name f f_batch bounds value')
+
+# the test functions of helper.py at their documented bounds, dimensions and optima
+CASES = [
+    Case('goldstein-price', func1,  func1_batch,  [[-2, 2]] * 2,       3.),
+    Case('rosenbrock',      func2,  func2_batch,  [[-5, 5], [-2, 8]],  0.),
+    Case('six-hump-camel',  func3,  func3_batch,  [[-3, 2]] * 2,       -1.031628453489877),
+    Case('rastrigin',       func4,  func4_batch,  [[-1, 1]] * 2,       -2.),
+    Case('griewank-2d',     functools.partial(func5, nopt=2),   functools.partial(func5_batch, nopt=2),
+         [[-600, 600]] * 2,  0.),
+    Case('griewank-10d',    func5,  func5_batch,  [[-600, 600]] * 10,  0.),
+    Case('hartmann-3d',     func6,  func6_batch,  [[0, 1]] * 3,        -3.86278),
+    Case('hartmann-6d',     functools.partial(func6, nopt=6),   functools.partial(func6_batch, nopt=6),
+         [[0, 1]] * 6,       -3.32237),
+    Case('branin',          func7,  func7_batch,  [[-5, 10], [0, 15]], 0.397887),
+    Case('shekel-5',        func8,  func8_batch,  [[0, 10]] * 4,       -10.1532),
+    Case('shekel-7',        functools.partial(func8, m=7),      functools.partial(func8_batch, m=7),
+         [[0, 10]] * 4,      -10.4029),
+    Case('shekel-10',       functools.partial(func8, m=10),     functools.partial(func8_batch, m=10),
+         [[0, 10]] * 4,      -10.5364),
+    Case('shubert',         func9,  func9_batch,  [[-10, 10]] * 2,     -186.7309),
+    Case('michalewicz-2d',  functools.partial(func10, nopt=2),  functools.partial(func10_batch, nopt=2),
+         [[0, np.pi]] * 2,   -1.8013),
+    Case('michalewicz-5d',  func10, func10_batch, [[0, np.pi]] * 5,    -4.687658),
+    Case('michalewicz-10d', functools.partial(func10, nopt=10), functools.partial(func10_batch, nopt=10),
+         [[0, np.pi]] * 10,  -9.66015),
+    Case('schwefel',        func11, func11_batch, [[-500, 500]] * 4,   0.),
+]
+
+SELECTIONS = {'original': OriginalSelection, 'direct-l': LocallyBiasedSelection}
+DIVISIONS  = {'all': AllLongestSides, 'one': OneLongestSide}
+LOCALS     = {'nelder-mead': NelderMead, 'pattern': PatternSearch}
+
+FIELDS = ['case', 'dim', 'optimum', 'best', 'error', 'reached', 'evals_to_tol', 'n_feval', 'n_iter',
+          'n_rectdiv', 'peak_rects', 'wall_time', 'peak_rss_mib']
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+class Budgeted():
+    """Objective raising BudgetExhausted past `budget` evaluations, counting each row of a batch if
+    `vectorized`. A known optimum makes Direct run until it is reached within tolerance whatever
+    max_feval is, so the budget is enforced here to bound every case.
+    """
+    def __init__(self, f, budget, vectorized=False):
+        self.f          = f
+        self.budget     = budget
+        self.vectorized = vectorized
+        self.n_calls    = 0
+
+    def __call__(self, x):
+        if self.n_calls >= self.budget:
+            raise BudgetExhausted()
+        self.n_calls += len(x) if self.vectorized else 1
+        return self.f(x)
+
+
+def peak_rss_mib():
+    """Return the peak resident set size of this process in MiB, or None where it is not available."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10    # bytes on macOS, KiB elsewhere
+
+
+def run_case(case, max_feval=20000, tol=1e-2, repeat=1, **kwargs):
+    """Run Direct on `case` until its optimum is reached within `tol` or `max_feval` evaluations are
+    used, `repeat` times, and return the record of the fastest run.
+    :param kwargs: further Direct arguments; with vectorized=True the batch version of the case is used
+    """
+    bounds = np.array(case.bounds, dtype=float)
+    vectorized = kwargs.get('vectorized', False)
+    wall_time = float('inf')
+    for _ in range(repeat):
+        f = Budgeted(case.f_batch if vectorized else case.f, max_feval, vectorized)
+        d = Direct(f, bounds, globalmin=GlobalMin(known=True, val=case.value), tol=tol, **kwargs)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                d.run(None)
+            except BudgetExhausted:
+                pass
+        wall_time = min(wall_time, time.perf_counter() - start)
+    best  = float(d.true_sign(d.curr_opt))
+    error = (best - case.value)/abs(case.value) if case.value else best
+    return {
+        'case':         case.name,
+        'dim':          len(bounds),
+        'optimum':      case.value,
+        'best':         best,
+        'error':        error,
+        'reached':      d.stop_reason == 'optimum',
+        'evals_to_tol': d.n_feval if d.stop_reason == 'optimum' else None,
+        'n_feval':      d.n_feval,
+        'n_iter':       d.n_iter,
+        'n_rectdiv':    d.n_rectdiv,
+        'peak_rects':   len(d.rects),
+        'wall_time':    wall_time,
+        'peak_rss_mib': peak_rss_mib(),
+    }
+
+
+def run_cases(cases=CASES, isolate=True, **kwargs):
+    """Yield the record of each case in turn. With `isolate` each case runs in a fresh process, so its
+    peak RSS is its own rather than the largest seen so far.
+    """
+    for case in cases:
+        if not isolate:
+            yield run_case(case, **kwargs)
+            continue
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            yield pool.apply(run_case, (case,), kwargs)
+
+
+def write_json(records, path, **params):
+    with open(path, 'w') as file:
+        json.dump({'params': params, 'results': records}, file, indent=2)
+
+
+def read_json(path):
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def write_csv(records, path):
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def compare(records, baseline, time_tol=0.25, time_floor=0.05, rss_tol=0.25):
+    """Return the regressions of `records` against the `baseline` records, as (case, metric, base, new).
+    The search is deterministic, so any loss of the optimum or extra evaluation to reach it is a
+    regression; wall time and peak RSS only beyond a relative `time_tol` / `rss_tol`, and wall time
+    also beyond `time_floor` seconds to ignore timer noise on the fast cases.
+    """
+    base = {record['case']: record for record in baseline}
+    regressions = []
+    for record in records:
+        if record['case'] not in base:
+            continue
+        old, name = base[record['case']], record['case']
+        if old['reached'] and not record['reached']:
+            regressions.append((name, 'reached', True, False))
+        elif old['reached'] and record['evals_to_tol'] > old['evals_to_tol']:
+            regressions.append((name, 'evals_to_tol', old['evals_to_tol'], record['evals_to_tol']))
+        if record['wall_time'] > max(old['wall_time'] * (1 + time_tol), old['wall_time'] + time_floor):
+            regressions.append((name, 'wall_time', old['wall_time'], record['wall_time']))
+        if None not in (old['peak_rss_mib'], record['peak_rss_mib']) and \
+                record['peak_rss_mib'] > old['peak_rss_mib'] * (1 + rss_tol):
+            regressions.append((name, 'peak_rss_mib', old['peak_rss_mib'], record['peak_rss_mib']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Direct on the helper.py test functions.")
+    parser.add_argument('--cases', help="comma separated case names, all by default")
+    parser.add_argument('--max-feval', type=int, default=20000, help="evaluation budget per case")
+    parser.add_argument('--tol', type=float, default=1e-2, help="relative tolerance on the known optimum")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per case, the fastest is kept")
+    parser.add_argument('--vectorized', action='store_true', help="evaluate each iteration in one batch call")
+    parser.add_argument('--selection', choices=sorted(SELECTIONS), default='original', help="selection rule")
+    parser.add_argument('--division', choices=sorted(DIVISIONS), default='all', help="division rule")
+    parser.add_argument('--local', choices=sorted(LOCALS), help="refine the incumbent with this local search")
+    parser.add_argument('--mode', choices=['rect', 'hilbert'], default='rect', help="divide the hyper-cube, or the Hilbert curve")
+    parser.add_argument('--bits', type=int, default=5, help="Hilbert curve resolution per dimension, in hilbert mode")
+    parser.add_argument('--no-isolate', action='store_true', help="run every case in this process")
+    parser.add_argument('--json', help="write the results to this JSON file")
+    parser.add_argument('--csv', help="write the results to this CSV file")
+    parser.add_argument('--baseline', help="JSON results to compare against; exit 1 on regressions")
+    args = parser.parse_args(argv)
+
+    cases = CASES
+    if args.cases:
+        names = args.cases.split(',')
+        cases = [case for case in CASES if case.name in names]
+    params = dict(max_feval=args.max_feval, tol=args.tol, repeat=args.repeat, vectorized=args.vectorized,
+                  mode=args.mode, bits=args.bits)
+    strategies = dict(selection=SELECTIONS[args.selection](), division=DIVISIONS[args.division](),
+                      local=LOCALS[args.local]() if args.local else None)
+    records = []
+    print("%-16s %4s %8s %7s %7s %8s %9s %8s" % ('case', 'dim', 'reached', 'evals', 'iter', 'rects', 'time[s]', 'rss[MiB]'))
+    for record in run_cases(cases, isolate=not args.no_isolate, **params, **strategies):
+        records.append(record)
+        print("%-16s %4d %8s %7d %7d %8d %9.3f %8s" % (record['case'], record['dim'], record['reached'],
+              record['n_feval'], record['n_iter'], record['peak_rects'], record['wall_time'],
+              '-' if record['peak_rss_mib'] is None else '%.1f' % record['peak_rss_mib']))
+    if args.json:
+        write_json(records, args.json, selection=args.selection, division=args.division, local=args.local,
+                   **params)
+    if args.csv:
+        write_csv(records, args.csv)
+    if args.baseline:
+        regressions = compare(records, read_json(args.baseline))
+        for name, metric, old, new in regressions:
+            print("REGRESSION %s: %s %s -> %s" % (name, metric, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
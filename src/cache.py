@@ -0,0 +1,77 @@
+import collections
+import os
+
+import numpy as np
+
+
+class EvalCache():
+    """Cache of f values keyed on exact lattice coordinates of rectangle centers.
+    Entries are kept in memory, least recently used first evicted beyond `maxsize`. If `path` is given
+    they are also appended to that file and read back when a later run opens it, so reruns on the same
+    objective and bounds replay the evaluations they already paid for.
+
+    File layout: float64 header (lattice dimension, Hilbert bits or 0, bounds (D x 2)), then one record
+    per evaluation: int64 center, float64 f_val. A truncated last record (e.g. from a killed run) is ignored.
+    """
+    def __init__(self, maxsize=None, path=None):
+        self.maxsize = maxsize
+        self.path    = path
+        self.entries = collections.OrderedDict()    # center.tobytes() -> f_val
+        self.file    = None
+        self.dtype   = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def open(self, bounds, ndim=None, bits=0):
+        """Bind the cache to a problem, loading the evaluations stored in `path` for the same one.
+        :param ndim: dimension of the lattice the centers live on, by default that of `bounds`
+        :param bits: Hilbert curve resolution if the lattice is the curve's unit interval
+        """
+        ndim        = bounds.shape[0] if ndim is None else ndim
+        self.dtype  = np.dtype([('center', '<i8', (ndim,)), ('f_val', '<f8')])
+        if self.path is None:
+            return
+        header = np.concatenate(([ndim, bits], bounds.ravel())).astype('<f8')
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, 'rb') as file:
+                stored = np.fromfile(file, dtype='<f8', count=len(header))
+                if len(stored) != len(header) or not np.array_equal(stored, header):
+                    raise ValueError("Cache file %s was written for another problem" % self.path)
+                records = np.frombuffer(file.read(), dtype=np.uint8)
+            n = len(records) // self.dtype.itemsize
+            for record in records[:n * self.dtype.itemsize].view(self.dtype):
+                self.store(record['center'], float(record['f_val']))
+            self.file = open(self.path, 'ab')
+            self.file.truncate(header.nbytes + n * self.dtype.itemsize)
+        else:
+            self.file = open(self.path, 'wb')
+            self.file.write(header.tobytes())
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def get(self, center):
+        """Return the cached f_val at `center`, or None."""
+        key = np.ascontiguousarray(center, dtype=np.int64).tobytes()
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, center, f_val):
+        """Cache `f_val` at `center`, appending it to the file."""
+        self.store(center, f_val)
+        if self.file is not None:
+            record = np.zeros(1, dtype=self.dtype)
+            record['center'], record['f_val'] = center, f_val
+            self.file.write(record.tobytes())
+            self.file.flush()
+
+    def store(self, center, f_val):
+        self.entries[np.ascontiguousarray(center, dtype=np.int64).tobytes()] = f_val
+        if self.maxsize is not None and len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
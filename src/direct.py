@@ -1,5 +1,15 @@
+import asyncio
+import collections
+import inspect
+import heapq
+import itertools
+import json
+import os
+import time
+
 import numpy as np
 import _hilbert
+from spatial import HilbertIndex
 
 class GlobalMin():
     def __init__(self, minimize=True, known=False, val=None):
@@ -8,20 +18,482 @@ class GlobalMin():
         self.value    = val
 
 
-class Rectangle():
-    def __init__(self, center, f_val, sides):
-        self.center  = center
-        self.f_val   = f_val
-        self.sides   = sides
-        self.__str__ = f_val
+MAX_LEVEL = 39                 # deepest trisection level; 2 * 3^39 < 2^63
+LATTICE   = 2 * 3 ** MAX_LEVEL # lattice points per unit length; every center is an odd multiple of a power of 3
+PREDICTED = -1                 # fidelity of a value predicted by the surrogate, not evaluated
+EVAL_TIME_WEIGHT = 0.3         # weight of the last iteration in the moving average of the time per evaluation
+
+
+class RectangleStore():
+    """Structure-of-arrays storage of rectangles, in columns grown by doubling. Row i holds rectangle i:
+    its center as exact integer lattice coordinates (unit coordinate * LATTICE), its trisection level per
+    dimension (side = 3^-level), its f_val and its size class. Only the longest sides are ever divided, so
+    levels differ by at most one and their sum is an exact size class, ordered inversely to d2.
+    Each size class keeps a min-heap of (f_val, i), so its best rectangle is found in O(1) and a rectangle
+    is moved between classes in O(log n). Rectangles with every side at `max_level` (MAX_LEVEL by default)
+    cannot be divided and are kept out of the size classes.
+
+    Memory can be bounded: with `path` the columns are memory-mapped files `path`.<column>, so the rows of
+    rectangles not touched lately are paged out, and beyond `max_entries` heap entries in memory the least
+    recently touched size classes are spilled to `path`.spill, where the selection reads their best entry
+    without loading them back (see `spill_cold`). `prune` drops the entries that can no longer be selected.
+    """
+    COLUMNS = (('centers', np.int64), ('levels', np.uint8), ('f_vals', np.float64), ('size', np.int32))
+
+    def __init__(self, ndim, capacity=256, path=None, max_entries=None, max_level=MAX_LEVEL):
+        self.D           = ndim
+        self.max_level   = max_level  # deepest trisection level of a side
+        self.n           = 0          # number of rectangles
+        self.path        = path
+        self.max_entries = max_entries
+        self.n_entries   = 0          # heap entries held in memory
+        self.n_pruned    = 0          # heap entries dropped by prune
+        self.touched     = {}         # size class -> time of its last push or take, if spilling
+        self.clock       = 0
+        self.spill_file  = None
+        for name, dtype in self.COLUMNS:
+            if path is not None:
+                open(path + '.' + name, 'wb').close()
+            setattr(self, name, self.column(name, dtype, capacity))
+        self.classes = {}         # sum of levels -> heap of (f_val, i), or SpilledClass
+
+    def __len__(self):
+        return self.n
+
+    def column(self, name, dtype, capacity, old=None):
+        """Return column `name` with room for `capacity` rows, holding the rows of `old`."""
+        shape = (capacity, self.D) if name in ('centers', 'levels') else (capacity,)
+        if self.path is None:
+            column = np.empty(shape, dtype=dtype)
+            if old is not None:
+                column[:self.n] = old[:self.n]
+            return column
+        with open(self.path + '.' + name, 'r+b') as file:    # the file keeps the rows, only grows
+            file.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        # a plain view of the shared map: writes reach the file all the same, and scalar indexing is faster
+        return np.memmap(self.path + '.' + name, dtype=dtype, mode='r+', shape=shape).view(np.ndarray)
+
+    def add(self, center, f_val, levels):
+        """Store a new rectangle in its size class and return its index."""
+        if self.n == len(self.f_vals):
+            for name, dtype in self.COLUMNS:
+                setattr(self, name, self.column(name, dtype, 2 * len(self.f_vals), getattr(self, name)))
+        i = self.n
+        self.n           += 1
+        self.centers[i]   = center
+        self.f_vals[i]    = f_val
+        self.resize(i, levels)
+        self.push(i)
+        return i
+
+    def resize(self, i, levels):
+        """Set the trisection levels of rectangle `i`, which must not be in a size class."""
+        self.levels[i] = levels
+        self.size[i]   = levels.sum()
+
+    def push(self, i):
+        """Put rectangle `i` into its size class."""
+        if self.size[i] < self.max_level * self.D:
+            key  = int(self.size[i])
+            heap = self.classes.setdefault(key, [])
+            if self.max_entries is not None:
+                self.clock       += 1
+                self.touched[key] = self.clock
+            if isinstance(heap, SpilledClass):
+                heap.push((float(self.f_vals[i]), i))
+            else:
+                heapq.heappush(heap, (float(self.f_vals[i]), i))
+            self.n_entries += 1
+
+    def take(self, i):
+        """Take rectangle `i` out of its size class, dropping the class once empty."""
+        key  = int(self.size[i])
+        heap = self.classes[key]
+        if self.max_entries is not None:
+            self.clock       += 1
+            self.touched[key] = self.clock
+        if isinstance(heap, SpilledClass):
+            if heap[0][1] == i:    # rectangles are taken as the best of their class
+                self.n_entries -= heap.pop()
+            else:                  # load the class back
+                self.n_entries += heap.count
+                heap = self.classes[key] = heap.entries()
+        if not isinstance(heap, SpilledClass):
+            if heap[0][1] == i:
+                heapq.heappop(heap)
+            else:
+                heap.remove((self.f_vals[i], i))
+                heapq.heapify(heap)
+            self.n_entries -= 1
+        if not len(heap):
+            del self.classes[key]
+            self.touched.pop(key, None)
+
+    def best(self, key):
+        """Return the index of the rectangle with the lowest f_val in size class `key`."""
+        return self.classes[key][0][1]
+
+    def d2(self, size):
+        """Return the squared half-diagonal of rectangles in size class(es) `size`."""
+        k, j = np.divmod(size, self.D)    # j sides at level k+1, the others at level k
+        return ((self.D - j) * 9. ** -k + j * 9. ** -(k + 1)) / 4.
+
+    def prune(self, n_takes):
+        """Keep only the `n_takes` best entries of each size class, the most that can still be taken from it.
+        A class is only cut once it holds twice as many, so that its cost is amortized over the pushes.
+        """
+        for key, heap in self.classes.items():
+            if len(heap) <= 2 * n_takes:
+                continue
+            self.n_pruned += len(heap) - n_takes
+            if isinstance(heap, SpilledClass):
+                self.n_entries -= len(heap.extra)
+                heap.truncate(n_takes)
+                self.n_entries += len(heap.extra)
+            else:
+                self.n_entries -= len(heap) - n_takes
+                self.classes[key] = heapq.nsmallest(n_takes, heap)    # a sorted list is a heap
+
+    def spill_cold(self):
+        """Spill the least recently touched size classes to disk until at most `max_entries` heap entries
+        remain in memory. A spilled class keeps the entries pushed since in memory, and is spilled again once
+        it holds many; it is only loaded back if a rectangle other than its best is taken out of it.
+        """
+        if self.n_entries <= self.max_entries:
+            return
+        if self.spill_file is None:
+            self.spill_file = open(self.path + '.spill', 'w+b')
+        for key in sorted(self.touched, key=self.touched.get):
+            heap = self.classes.get(key)
+            in_memory = len(heap.extra) if isinstance(heap, SpilledClass) else len(heap or ())
+            if in_memory < 2:
+                continue
+            if isinstance(heap, SpilledClass):
+                entries = np.concatenate((heap.disk(), SpilledClass.records(heap.extra)))
+            else:
+                entries = SpilledClass.records(heap)
+            entries = entries[np.lexsort((entries['i'], entries['f_val']))]
+            offset  = self.spill_file.seek(0, os.SEEK_END)
+            self.spill_file.write(entries.tobytes())
+            self.spill_file.flush()
+            self.classes[key] = SpilledClass(self.spill_file, offset, entries)
+            self.n_entries   -= in_memory
+            if self.n_entries <= self.max_entries:
+                break
+        live = sum(heap.count for heap in self.classes.values() if isinstance(heap, SpilledClass))
+        if self.spill_file.seek(0, os.SEEK_END) > 3 * SpilledClass.DTYPE.itemsize * max(live, self.max_entries):
+            self.compact_spill()    # over two thirds of the file is taken, pruned or loaded back
+
+    def compact_spill(self):
+        """Rewrite the spill file with the entries of the spilled classes only, dropping those taken or pruned."""
+        spilled = {key: heap for key, heap in self.classes.items() if isinstance(heap, SpilledClass)}
+        disk    = {key: heap.disk() for key, heap in spilled.items()}
+        self.spill_file.seek(0)
+        self.spill_file.truncate()
+        for key, heap in spilled.items():
+            heap.offset = self.spill_file.tell()
+            self.spill_file.write(disk[key].tobytes())
+        self.spill_file.flush()
+
+
+class SpilledClass():
+    """Size class whose entries are stored sorted in the spill `file` from byte `offset`, but for those
+    pushed since, kept in the heap `extra`. Reads as a heap for the selection: `[0]` is its best entry.
+    """
+    DTYPE = np.dtype([('f_val', '<f8'), ('i', '<i8')])
+
+    def __init__(self, file, offset, entries):
+        self.file   = file
+        self.offset = offset
+        self.count  = len(entries)    # entries left on disk
+        self.first  = (float(entries['f_val'][0]), int(entries['i'][0]))
+        self.extra  = []
+
+    def __len__(self):
+        return self.count + len(self.extra)
+
+    def __getitem__(self, k):
+        if k != 0:
+            return self.entries()[k]
+        if self.extra and (not self.count or self.extra[0] < self.first):
+            return self.extra[0]
+        return self.first
+
+    def __iter__(self):
+        return iter(self.entries())
+
+    def push(self, entry):
+        heapq.heappush(self.extra, entry)
+
+    def pop(self):
+        """Drop the best entry; return 1 if it was held in memory, else 0."""
+        if self.extra and (not self.count or self.extra[0] < self.first):
+            heapq.heappop(self.extra)
+            return 1
+        self.offset += self.DTYPE.itemsize
+        self.count  -= 1
+        if self.count:
+            self.first = self.read(0)
+        return 0
+
+    def truncate(self, n):
+        """Keep only the `n` best entries."""
+        entries, extra = self.entries()[:n], set(self.extra)
+        self.extra = [entry for entry in entries if entry in extra]    # sorted, so still a heap
+        self.count = len(entries) - len(self.extra)    # the best entries on disk come first
+
+    @classmethod
+    def records(cls, entries):
+        """Return the (f_val, i) `entries` as an array of DTYPE."""
+        records = np.empty(len(entries), dtype=cls.DTYPE)
+        if entries:
+            records['f_val'], records['i'] = zip(*entries)
+        return records
+
+    def read(self, k):
+        """Return the `k`th entry left on disk."""
+        self.file.seek(self.offset + k * self.DTYPE.itemsize)
+        f_val, i = np.frombuffer(self.file.read(self.DTYPE.itemsize), dtype=self.DTYPE)[0].tolist()
+        return f_val, i
+
+    def disk(self):
+        """Return the entries left on disk, sorted."""
+        self.file.seek(self.offset)
+        return np.fromfile(self.file, dtype=self.DTYPE, count=self.count)
+
+    def entries(self):
+        """Return all entries as a sorted list of (f_val, i), which is a heap."""
+        disk = self.disk()
+        return sorted(list(zip(disk['f_val'].tolist(), disk['i'].tolist())) + self.extra)
+
+
+class Fidelity(collections.namedtuple('Fidelity', 'f cost min_d2')):
+    """One fidelity of a multi-fidelity objective: `f` at a relative `cost` per evaluation, scoring the
+    rectangles whose squared half-diagonal is at least `min_d2` (0 for the highest fidelity).
+    """
+    __slots__ = ()
+
+    def __new__(cls, f, cost=1., min_d2=0.):
+        return super().__new__(cls, f, cost, min_d2)
+
+
+class Negated():
+    """Picklable wrapper of f for maximization problems, so f_wrap can be sent to worker processes."""
+    def __init__(self, f):
+        self.f = f
+
+    def __call__(self, x):
+        return -self.f(x)
+
+
+class OriginalSelection():
+    """Selection rule of the original DIRECT: in each size class (by half-diagonal) its best rectangle, if
+    it lies on the lower right convex hull of the classes and passes the epsilon test.
+    """
+    def select(self, direct):
+        classes = direct.rects.classes    # {sum of levels: heap of (f_val, i)}
+        if not classes:
+            return []
+        keys   = np.fromiter(classes, int, len(classes))
+        f_val  = np.fromiter((heap[0][0] for heap in classes.values()), float, len(classes))
+        order  = np.argsort(-keys)    # sort based on size, d2 decreases with the sum of levels
+        keys   = keys[order]
+        po     = direct.select_on_hull(direct.rects.d2(keys), f_val[order])
+        return [direct.rects.best(key) for key in keys[po].tolist()]    # return rectangle indices
+
+
+class LocallyBiasedSelection():
+    """Selection rule of DIRECT-L (Gablonsky and Kelley): rectangles are grouped by their longest side,
+    which merges size classes into fewer, coarser groups, and at most one rectangle per group (its best)
+    is selected, from the lower right convex hull with the epsilon test. This biases the search toward
+    the incumbent's neighbourhood, and suits objectives with few local minima.
+    """
+    def select(self, direct):
+        classes = direct.rects.classes
+        if not classes:
+            return []
+        keys   = np.fromiter(classes, int, len(classes))
+        f_val  = np.fromiter((heap[0][0] for heap in classes.values()), float, len(classes))
+        best   = np.fromiter((heap[0][1] for heap in classes.values()), int, len(classes))
+        group  = keys // direct.rects.D    # level of the longest sides
+        order  = np.lexsort((best, f_val, -group))    # by longest side, ascending, then best first
+        group, f_val, best = group[order], f_val[order], best[order]
+        first  = np.concatenate(([True], group[1:] != group[:-1]))
+        group, f_val, best = group[first], f_val[first], best[first]
+        po     = direct.select_on_hull(3. ** -group.astype(float) / 2., f_val)    # half the longest side
+        return best[po].tolist()
+
+
+class AllLongestSides():
+    """Division rule of the original DIRECT: trisect every longest side."""
+    def sides(self, levels):
+        return np.nonzero(levels == levels.min())[0]
+
+
+class OneLongestSide():
+    """Trisect only the first longest side, 2 evaluations per division rather than 2 per longest side."""
+    def sides(self, levels):
+        return np.array([np.argmin(levels)])
+
+
+class NelderMead():
+    """Nelder-Mead simplex search within a box, for hybrid refinement of the incumbent (see Direct `local`).
+    `search` is a generator yielding the points to evaluate and sent their f values.
+    :param every: search every `every` iterations, when a new rectangle has improved the incumbent
+    :param budget: most evaluations per search, 20 * D by default
+    :param step: initial simplex edge, relative to the box
+    :param xtol: stop once the simplex is this small, relative to the box
+    """
+    def __init__(self, every=1, budget=None, step=0.25, xtol=1e-8):
+        self.every  = every
+        self.budget = budget
+        self.step   = step
+        self.xtol   = xtol
+
+    def search(self, x0, f0, lower, upper):
+        n, width = len(x0), upper - lower
+        clip     = lambda x: np.clip(x, lower, upper)
+        simplex, values = [x0], [f0]
+        for i in range(n):
+            x    = x0.copy()
+            x[i] = x0[i] + self.step * width[i] if x0[i] + self.step * width[i] <= upper[i] else x0[i] - self.step * width[i]
+            simplex.append(x)
+            values.append((yield x))
+        simplex, values = np.array(simplex), np.array(values)
+        while True:
+            order = np.argsort(values, kind='stable')
+            simplex, values = simplex[order], values[order]
+            if np.max(np.abs(simplex[1:] - simplex[0]) / width) < self.xtol:
+                return
+            centroid = simplex[:-1].mean(axis=0)
+            xr = clip(2 * centroid - simplex[-1])    # reflection
+            fr = yield xr
+            if fr < values[0]:
+                xe = clip(3 * centroid - 2 * simplex[-1])    # expansion
+                fe = yield xe
+                simplex[-1], values[-1] = (xe, fe) if fe < fr else (xr, fr)
+            elif fr < values[-2]:
+                simplex[-1], values[-1] = xr, fr
+            else:
+                xc = clip(centroid + 0.5 * ((xr if fr < values[-1] else simplex[-1]) - centroid))    # contraction
+                fc = yield xc
+                if fc < min(fr, values[-1]):
+                    simplex[-1], values[-1] = xc, fc
+                else:    # shrink toward the best vertex
+                    for k in range(1, n + 1):
+                        simplex[k] = simplex[0] + 0.5 * (simplex[k] - simplex[0])
+                        values[k]  = yield simplex[k].copy()
+
+
+class PatternSearch():
+    """Compass search within a box: try a step along each axis, both ways, halving the steps when none
+    improves. Same interface as NelderMead.
+    """
+    def __init__(self, every=1, budget=None, step=0.25, xtol=1e-8):
+        self.every  = every
+        self.budget = budget
+        self.step   = step
+        self.xtol   = xtol
+
+    def search(self, x0, f0, lower, upper):
+        width = upper - lower
+        x, fx, step = x0.copy(), f0, self.step * width
+        while np.max(step / width) >= self.xtol:
+            improved = False
+            for i in range(len(x)):
+                for sign in (1., -1.):
+                    y    = x.copy()
+                    y[i] = np.clip(x[i] + sign * step[i], lower[i], upper[i])
+                    if y[i] == x[i]:
+                        continue
+                    fy = yield y
+                    if fy < fx:
+                        x, fx, improved = y, fy, True
+                        break
+            if not improved:
+                step = step / 2
+
+
+# state after an iteration: f and the points (real coordinates, (k, D)) evaluated in it, with their f values
+Snapshot = collections.namedtuple('Snapshot', 'n_iter n_feval curr_opt x_at_opt points f_vals')
+
+
+class Profiler():
+    """Cumulative wall time and call counts of the phases of a search. Timed calls nest: a phase is charged
+    its own time only, e.g. division excludes the evaluations and insertions made while dividing.
+    Only installed when Direct is built with `profile=True`, by wrapping the bound methods of that
+    instance, so an unprofiled search runs the plain methods.
+    """
+    PHASES = ('selection', 'division', 'evaluation', 'insertion')
+
+    def __init__(self):
+        self.times      = dict.fromkeys(self.PHASES, 0.)
+        self.counts     = dict.fromkeys(self.PHASES, 0)
+        self.iterations = []    # per-iteration stats, see Direct.notify
+        self.stack      = []    # time spent in nested timed calls, per open call
+
+    def reset(self):
+        """Zero the totals in place: the iterations list is the one given to the observers."""
+        self.times.update(dict.fromkeys(self.PHASES, 0.))
+        self.counts.update(dict.fromkeys(self.PHASES, 0))
+        self.iterations.clear()
+        self.stack.clear()
+
+    def enter(self):
+        self.stack.append(0.)
+        return time.perf_counter()
+
+    def exit(self, phase, start, calls=1):
+        elapsed = time.perf_counter() - start
+        self.times[phase]  += elapsed - self.stack.pop()
+        self.counts[phase] += calls
+        if self.stack:
+            self.stack[-1] += elapsed
+
+    def timed(self, method, phase):
+        """Return `method` charging its calls to `phase`."""
+        def timed_method(*args, **kwargs):
+            start = self.enter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.exit(phase, start)
+        return timed_method
 
-    @property
-    def d2(self):    # size
-        return np.sum((self.sides / 2.) ** 2)
+    def timed_generator(self, method, phase):
+        """Return generator function `method` charging the production of each item to `phase`."""
+        def timed_method(*args, **kwargs):
+            items = method(*args, **kwargs)
+            try:
+                while True:
+                    start, calls = self.enter(), 0
+                    try:
+                        item  = next(items)
+                        calls = 1
+                    except StopIteration:
+                        return
+                    finally:
+                        self.exit(phase, start, calls)
+                    yield item
+            finally:
+                items.close()
+        return timed_method
+
+    def summary(self):
+        return {phase: {'time': self.times[phase], 'calls': self.counts[phase]} for phase in self.PHASES}
+
+
+class JsonlTrace():
+    """Observer writing the stats of each iteration to `file` as one JSON object per line."""
+    def __init__(self, file):
+        self.file = file
+
+    def __call__(self, stats):
+        self.file.write(json.dumps(stats) + "\n")
 
 
 class Direct():
-    def __init__(self, f, bounds, epsilon=1e-4, max_feval=200, max_iter=10, max_rectdiv=100, globalmin=GlobalMin(), tol = 1e-2, bits = 5):
+    def __init__(self, f, bounds, epsilon=1e-4, max_feval=200, max_iter=10, max_rectdiv=100, globalmin=GlobalMin(), tol = 1e-2, bits = 5, vectorized=False, executor=None, cache=None, checkpoint=None, checkpoint_every=None, mode='rect', profile=False, selection=None, division=None, local=None, prune=False, spill=None, max_entries=None, surrogate=None, max_cost=None, promote_gap=0.1, deadline=None, stall_iter=None, stall_tol=1e-6, d2_tol=None, large_d2=None, volume_tol=0.01):
         self.epsilon       = epsilon  # global/local weight parameter
         self.max_feval     = max_feval
         self.max_iter      = max_iter
@@ -33,192 +505,921 @@ class Direct():
         self.n_feval       = 1
         self.n_rectdiv     = 0
         self.n_iter        = 0
-        self.d_rect        = {}
         self.TERMINATE     = False
+        self.stop_reason   = None        # the criterion that ended the search, see stop, or 'max_iter'
+        self.vectorized    = vectorized  # f maps a (k, D) array of points to k values in one call
+        self.executor      = executor    # concurrent.futures executor evaluating an iteration's points in parallel
+        self.cache         = cache       # cache.EvalCache consulted before calling f
+        self.n_cache_hits  = 0           # evaluations answered by the cache, included in n_feval
+        self.n_real        = 1           # values of f evaluated (or cached), n_feval less those predicted by the surrogate
+        self.max_cost      = max_cost    # budget in cost units of the fidelities, replacing max_feval if given
+        self.promote_gap   = promote_gap # low fidelity rectangles selected within it of curr_opt (relative) are promoted
+        self.deadline      = deadline    # seconds the search may run for, from its start, see affordable
+        self.end_time      = None        # time.monotonic() at which the deadline falls, set at the start
+        self.eval_time     = None        # moving average of the wall time per evaluation, divisions included
+        # convergence criteria of problems of unknown optimum, see check_resolution and check_convergence
+        self.stall_iter    = stall_iter  # iterations without a relative improvement of curr_opt above stall_tol
+        self.stall_tol     = stall_tol
+        self.stall_opt     = np.inf      # curr_opt at its last improvement
+        self.stall_since   = 0           # iteration of that improvement
+        self.d2_tol        = d2_tol      # smallest d2 of a potentially optimal rectangle
+        self.large_d2      = large_d2    # d2 above which a rectangle is still large, see large_volume
+        self.volume_tol    = volume_tol  # fraction of the volume left in large rectangles
+        self.checkpoint    = checkpoint  # path of the checkpoint saved by run, at the end and every checkpoint_every evaluations
+        self.checkpoint_every = checkpoint_every
+        self.n_feval_saved = 0
+        self.pending       = []          # rectangles left to divide in the current iteration
+        self.partial       = []          # values of f already evaluated at the new centers of pending[0]
+        self.partial_fidelity = []       # the fidelity of each of those, or PREDICTED
         # nD hyper-cube of side R = 2^bits
         self.D             = bounds.shape[0]
         self.bits          = bits
         self.N             = 2 ** (bits * self.D) # number of cells = R^nD
+        self.mode          = mode     # 'rect': divide the hyper-cube, 'hilbert': divide [0, 1) mapped onto the Hilbert curve
+        self.rects         = RectangleStore(1 if mode == 'hilbert' else self.D, path=spill, max_entries=max_entries,
+                                            max_level=self.hilbert_level() if mode == 'hilbert' else MAX_LEVEL)
+        self.prune         = prune       # drop the rectangles the remaining budget cannot reach, if it is bounded
+        self.selection     = selection or OriginalSelection()  # picks the rectangles to divide, select(direct)
+        self.division      = division or AllLongestSides()     # picks the longest sides to trisect, sides(levels)
+        self.local         = local       # NelderMead or PatternSearch refining the incumbent within its rectangle
+        self.local_opt     = np.inf      # curr_opt when the last local search ended
+        self.surrogate     = surrogate   # surrogate.RBFSurrogate screening out new centers predicted to be poor
+        self.provisional   = set()       # rectangles whose f_val is predicted, to be evaluated once selected
+        self.n_modeled     = 0           # rectangles up to which the real values were given to the surrogate
+        self.modeled       = []          # the rectangles whose real values were given to it, in that order
+        self.screened      = None        # its predictions at the new centers left in the iteration, if stopped in one
+        self.resolved      = []          # (point, f_val) of the rectangles promoted to the top fidelity this iteration
+        self.low           = {}          # rectangle -> fidelity of its f_val, if below the top one
+        self.index         = None        # spatial.HilbertIndex of the rectangle centers, built by the first query
+        self.observers     = []          # callables given the stats of each iteration, see notify
+        self.profiler      = None        # Profiler of the phases if profile, else the plain methods run
+        # f, or a list of Fidelity from the cheapest to the highest, which alone sets curr_opt and x_at_opt
+        self.fidelities    = list(f) if isinstance(f, (list, tuple)) else [Fidelity(f)]
+        self.top           = len(self.fidelities) - 1
+        self.f             = self.fidelities[-1].f
         if not self.globalmin.minimize:  # means maximization problem
-            self.f_wrap = lambda x: -f(x)
+            self.f_wraps = [Negated(fidelity.f) for fidelity in self.fidelities]
         else:
-            self.f_wrap = f
+            self.f_wraps = [fidelity.f for fidelity in self.fidelities]
+        self.f_wrap        = self.f_wraps[-1]
+        self.n_evals       = [0] * self.top + [1]    # evaluations per fidelity
+        self.cost          = self.fidelities[-1].cost
         assert isinstance(bounds, np.ndarray)
+        assert mode in ('rect', 'hilbert'), "mode must be 'rect' or 'hilbert'"
+        assert not (vectorized and executor), "vectorized and executor modes are exclusive"
+        assert not (local and mode == 'hilbert'), "local search needs the rectangles of 'rect' mode"
+        assert max_entries is None or spill is not None, "max_entries needs a spill path"
+        assert checkpoint_every is None or checkpoint is not None, "checkpoint_every needs a checkpoint path"
         assert np.all(self.scale > 0.)
+        if self.cache is not None:
+            self.cache.open(bounds, self.rects.D, bits if mode == 'hilbert' else 0)
+        if profile:
+            self.profiler = Profiler()
+            self.get_potentially_optimal_rects = self.profiler.timed(self.get_potentially_optimal_rects, 'selection')
+            self.divide_rectangles = self.profiler.timed(self.divide_rectangles, 'division')
+            self.evaluate          = self.profiler.timed_generator(self.evaluate, 'evaluation')
+            self.insert_rectangle  = self.profiler.timed(self.insert_rectangle, 'insertion')
+            self.rects.add         = self.profiler.timed(self.rects.add, 'insertion')
+            self.observers.append(self.profiler.iterations.append)
 
     def true_sign(self, val):
         return val if self.globalmin.minimize else -val
     
-    def divide_rectangle(self, po_rect):
-        maxlen      = np.max(po_rect.sides)
-        gap         = maxlen / 3.
-#         gap         = maxlen / 2. ** self.D
-        d_new_rects = {}
-        self.d_rect[po_rect.d2].remove(po_rect)    # dict[key].remove(val) - removes key, val
-        maxlen_sides = list(np.nonzero(po_rect.sides == maxlen)[0]) # only the longest sides are divided
-        # evaluate points near center
-        for side_idx in maxlen_sides:
-            d_new_rects[side_idx]  = []
-            new_center_u           = po_rect.center.copy()
-#             new_center_u           = self.l2u(po_rect.center)
-            new_center_u[side_idx] += gap
-            new_fval_u             = self.f_wrap(self.u2r(new_center_u))
-#             d_new_rects[side_idx].append(Rectangle(self.u2l(new_center_u), new_fval_u, po_rect.sides.copy()))
-            d_new_rects[side_idx].append(Rectangle(new_center_u, new_fval_u, po_rect.sides.copy()))
-
-            if new_fval_u < self.curr_opt:
-                self.curr_opt      = new_fval_u
-                self.x_at_opt      = self.u2r(new_center_u)
-            self.n_feval += 1
-
-            if self.globalmin.known:
-                if self.globalmin.value:
-                    error = (self.curr_opt - self.globalmin.value)/abs(self.globalmin.value)
-                else:   error = self.curr_opt
-                if error < self.tolerance:
-                    self.TERMINATE = True
-                    return
-            elif self.n_feval >= self.max_feval or self.n_rectdiv >= self.max_rectdiv:
-                self.TERMINATE = True
+    def check_termination(self):
+        """Set TERMINATE once the known optimum is reached within tolerance, the budget is used up or the
+        deadline has passed.
+        """
+        if self.globalmin.known:
+            if self.globalmin.value:
+                error = (self.curr_opt - self.globalmin.value)/abs(self.globalmin.value)
+            else:   error = self.curr_opt
+            if error < self.tolerance:
+                self.stop('optimum')
+        elif self.max_cost is not None and self.cost >= self.max_cost:
+            self.stop('max_cost')
+        elif self.max_cost is None and self.n_feval >= self.max_feval:
+            self.stop('max_feval')
+        elif self.n_rectdiv >= self.max_rectdiv:
+            self.stop('max_rectdiv')
+        if self.end_time is not None and time.monotonic() >= self.end_time:
+            self.stop('deadline')
+
+    def stop(self, reason):
+        """Set TERMINATE, with `reason` the criterion that fired unless the search already stopped on another."""
+        if not self.TERMINATE:
+            self.TERMINATE, self.stop_reason = True, reason
+
+    def count(self, fidelity):
+        """Account for the cost of one evaluation of f at `fidelity`."""
+        self.n_real += 1
+        self.n_evals[fidelity] += 1
+        self.cost   += self.fidelities[fidelity].cost
+
+    def update_opt(self, center, f_val, fidelity=None):
+        """Account for one function evaluation `f_val` at `center` (lattice coordinates), at `fidelity` (the
+        top one by default). A value at a lower fidelity, or PREDICTED by the surrogate, counts in n_feval but
+        is never the optimum.
+        """
+        fidelity = self.top if fidelity is None else fidelity
+        if fidelity != PREDICTED:
+            if fidelity == self.top and f_val < self.curr_opt:
+                self.curr_opt  = f_val
+                self.x_at_opt  = self.g2r(center)
+            self.count(fidelity)
+        self.n_feval += 1
+        self.check_termination()
+
+    def trisect(self, i):
+        """Return the longest sides of rectangle `i` and the centers of its new rectangles, two per side (+gap, -gap)."""
+        levels       = self.rects.levels[i]
+        level        = levels.min()
+        maxlen_sides = self.division.sides(levels)    # only (some of) the longest sides are divided
+        gap          = 2 * 3 ** (MAX_LEVEL - 1 - int(level))    # a third of the side, in lattice units
+        rows         = np.arange(len(maxlen_sides))
+        centers      = np.repeat(self.rects.centers[i][np.newaxis, :], 2 * len(maxlen_sides), axis=0)
+        centers[2*rows, maxlen_sides]   += gap
+        centers[2*rows+1, maxlen_sides] -= gap
+        return maxlen_sides, centers
+
+    def evaluate(self, centers, fidelity=None):
+        """Yield f at each of `centers` (lattice coordinates), in order, answering from the cache when possible.
+        :param fidelity: index of the Fidelity evaluated, the top one by default; only that one is cached
+        """
+        if self.cache is None or fidelity not in (None, self.top):
+            yield from self.evaluate_points(centers, fidelity)
+            return
+        cached  = [self.cache.get(center) for center in centers]
+        missing = [k for k, f_val in enumerate(cached) if f_val is None]
+        f_vals  = self.evaluate_points(centers[missing])
+        try:
+            for center, f_val in zip(centers, cached):
+                if f_val is None:
+                    f_val = next(f_vals)
+                    self.cache.put(center, self.true_sign(f_val))
+                else:
+                    f_val = self.true_sign(f_val)
+                    self.n_cache_hits += 1
+                yield f_val
+        finally:
+            f_vals.close()
+
+    def evaluate_points(self, centers, fidelity=None):
+        """Yield f (at `fidelity`, the top one by default) at each of `centers` (lattice coordinates), in order.
+        Points are evaluated lazily one at a time, with a single call to f if `vectorized`, or all
+        submitted at once to `executor`; evaluations not consumed when the generator is closed are cancelled.
+        """
+        f_wrap = self.f_wrap if fidelity is None else self.f_wraps[fidelity]
+        if self.vectorized:
+            if len(centers):
+                yield from np.asarray(f_wrap(self.g2r(centers)), dtype=float).reshape(len(centers))
+        elif self.executor is not None:
+            futures = [self.executor.submit(f_wrap, point) for point in self.g2r(centers)]
+            try:
+                for future in futures:
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+        else:
+            for center in centers:
+                yield f_wrap(self.g2r(center))
+
+    def evaluate_mixed(self, centers, fidelity, predicted=None):
+        """Yield f at each of `centers` (lattice coordinates) at its `fidelity`, in order, or where that is
+        PREDICTED its `predicted` value. Each fidelity is evaluated as one stream, see `evaluate`.
+        """
+        if (fidelity == self.top).all():
+            yield from self.evaluate(centers)
+            return
+        streams = {k: self.evaluate(centers[fidelity == k], k) for k in np.unique(fidelity).tolist() if k != PREDICTED}
+        try:
+            for k, value in zip(fidelity.tolist(), predicted.tolist() if predicted is not None else fidelity):
+                yield value if k == PREDICTED else next(streams[k])
+        finally:
+            for stream in streams.values():
+                stream.close()
+
+    def fidelity_for(self, size):
+        """Return the cheapest fidelity scoring rectangles of size class `size`."""
+        d2 = self.rects.d2(size)
+        return next(k for k, fidelity in enumerate(self.fidelities) if d2 >= fidelity.min_d2 or k == self.top)
+
+    def screen(self, centers):
+        """Return the values the surrogate predicts at the `centers` (lattice coordinates) it screens out, as
+        too far above curr_opt to be worth evaluating, and NaN at the others. The real values of the
+        rectangles created since the last call are given to it first.
+        """
+        if self.surrogate is None or not len(centers):
+            return np.full(len(centers), np.nan)
+        new  = [i for i in range(self.n_modeled, len(self.rects)) if i not in self.provisional and i not in self.low]
+        if new:
+            self.surrogate.add(self.r2u(self.g2r(self.rects.centers[new])), self.rects.f_vals[new])
+            self.modeled.extend(new)
+        self.n_modeled = len(self.rects)
+        return self.surrogate.screen(self.r2u(self.g2r(centers)), self.curr_opt)
+
+    def divide_rectangles(self, po_rects):
+        """Divide all potentially optimal rectangles of one iteration, feeding them from one stream of evaluations.
+        If the search stops part way, the undivided rectangles are kept in `pending` (and go back to their
+        size classes) so that a resumed run can finish the iteration, with the predictions of the surrogate
+        made for it in `screened`.
+        """
+        if not po_rects:    # every rectangle is at its deepest level
+            self.stop('max_level')
+            return
+        if self.provisional or self.low:
+            po_rects = self.promote(po_rects)
+            if not po_rects or self.TERMINATE:
                 return
+        splits      = [self.trisect(po_rect) for po_rect in po_rects]
+        new_centers = np.concatenate([centers for _, centers in splits])[len(self.partial):]
+        fidelity    = np.concatenate([self.children_fidelity(po_rect, maxlen_sides)
+                                      for po_rect, (maxlen_sides, _) in zip(po_rects, splits)])[len(self.partial):]
+        if self.screened is not None:    # finishing the iteration
+            predicted = self.screened
+        else:
+            predicted = np.full(len(new_centers), np.nan)
+            top       = fidelity == self.top
+            predicted[top] = self.screen(new_centers[top])
+        fidelity[~np.isnan(predicted)] = PREDICTED
+        f_vals      = self.evaluate_mixed(new_centers, fidelity, predicted)
+        fidelity    = iter(fidelity.tolist())
+        for po_rect in po_rects:
+            self.remove_rectangle(po_rect)
+        self.pending = list(po_rects)
+        for _, centers in splits:
+            n = len(centers) - len(self.partial)
+            self.divide_rectangle(self.pending[0], itertools.islice(f_vals, n), itertools.islice(fidelity, n))
+            if self.TERMINATE:
+                for undivided in self.pending:
+                    self.insert_rectangle(undivided)
+                n_left = sum(2 * len(self.division.sides(self.rects.levels[i])) for i in self.pending)
+                self.screened = predicted[len(predicted) - (n_left - len(self.partial)):]
+                break
+            self.pending.pop(0)
+        else:
+            self.screened = None
+        f_vals.close()
+
+    def children_fidelity(self, po_rect, maxlen_sides):
+        """Return the fidelity of the new centers of `po_rect`, that for the size it is divided to."""
+        fidelity = self.fidelity_for(self.rects.size[po_rect] + len(maxlen_sides)) if self.top else self.top
+        return np.full(2 * len(maxlen_sides), fidelity)
 
-            new_center_l           = po_rect.center.copy()
-#             new_center_l           = self.l2u(po_rect.center)
-            new_center_l[side_idx] -= gap
-            new_fval_l             = self.f_wrap(self.u2r(new_center_l))
-#             d_new_rects[side_idx].append(Rectangle(self.u2l(new_center_l), new_fval_l, po_rect.sides.copy()))
-            d_new_rects[side_idx].append(Rectangle(new_center_l, new_fval_l, po_rect.sides.copy()))
-
-            if new_fval_l < self.curr_opt:
-                self.curr_opt      = new_fval_l
-                self.x_at_opt      = self.u2r(new_center_l)
-            self.n_feval += 1
-            if self.globalmin.known:
-                if self.globalmin.value:
-                    error = (self.curr_opt - self.globalmin.value)/abs(self.globalmin.value)
-                else:   error = self.curr_opt
-                if error < self.tolerance:
-                    self.TERMINATE = True
-                    return
-            elif self.n_feval >= self.max_feval or self.n_rectdiv >= self.max_rectdiv:
-                self.TERMINATE = True
+    def divide_rectangle(self, po_rect, f_vals=None, fidelity=None):
+        """Trisect rectangle `po_rect`, already taken out of its size class, along its longest sides.
+        The values in `partial` were already evaluated at its first new centers before the search stopped.
+        :param f_vals: values of f at the other new centers in `trisect` order; evaluated here if not given
+        :param fidelity: the fidelity of each of those values, or PREDICTED; the top one by default
+        """
+        maxlen_sides, centers = self.trisect(po_rect)
+        new_fvals = self.partial
+        if f_vals is None:
+            fidelity = self.children_fidelity(po_rect, maxlen_sides)[len(new_fvals):]
+            f_vals   = self.evaluate_mixed(centers[len(new_fvals):], fidelity)
+        if fidelity is None:
+            fidelity = itertools.repeat(self.top)
+        # evaluate points near center
+        for center, f_val, k in zip(centers[len(new_fvals):], f_vals, fidelity):
+            new_fvals.append(f_val)
+            self.partial_fidelity.append(int(k))
+            self.update_opt(center, f_val, int(k))
+            if self.TERMINATE:
                 return
+        fidelity = self.partial_fidelity
+        self.partial, self.partial_fidelity = [], []
+        self.split_rectangle(po_rect, maxlen_sides, centers, new_fvals, fidelity)
 
+    def split_rectangle(self, po_rect, maxlen_sides, centers, f_vals, fidelity=None):
+        """Shrink rectangle `po_rect` and store it with its new rectangles, given f at their centers.
+        :param fidelity: the fidelity of each of the f values, or PREDICTED; the top one by default
+        """
+        levels = self.rects.levels[po_rect].copy()
         # axis with better function value get divided first
-        maxlen_sides = sorted(maxlen_sides, key=lambda x: min([t.f_val for t in d_new_rects[x]]))
-        for i in range(len(maxlen_sides)):
+        order = np.argsort([min(f_vals[2*i], f_vals[2*i+1]) for i in range(len(maxlen_sides))], kind='stable')
+        for i in range(len(order)):
             self.n_rectdiv += 1
-            for each_rect in d_new_rects[maxlen_sides[i]]:
-                for j in range(i+1):  # check if the length should be divided
-                    each_rect.sides[maxlen_sides[j]] /= 3.
-#                     each_rect.sides[maxlen_sides[j]] /= 2.
-        for side_idx in maxlen_sides:  # po_rect gets divided in every (longest) dimension
-#             po_rect.sides[side_idx] /= 2.
-            po_rect.sides[side_idx] /= 3.
-        for l_rect in d_new_rects.values():
-            for each_rect in l_rect:
-                if each_rect.d2 not in self.d_rect:
-                    self.d_rect[each_rect.d2] = [each_rect]
-                elif each_rect.f_val < self.d_rect[each_rect.d2][0].f_val:
-                    self.d_rect[each_rect.d2].insert(0, each_rect)
+            levels[maxlen_sides[order[i]]] += 1    # check if the length should be divided
+            for k in (2*order[i], 2*order[i]+1):
+                i_new = self.rects.add(centers[k], f_vals[k], levels)
+                if fidelity is not None and fidelity[k] == PREDICTED:
+                    self.provisional.add(i_new)
+                elif fidelity is not None and fidelity[k] != self.top:
+                    self.low[i_new] = fidelity[k]
+        self.rects.resize(po_rect, levels)    # po_rect gets divided in every (longest) dimension
+        self.insert_rectangle(po_rect)
+
+    def promotion(self, i):
+        """Return the fidelity rectangle `i` is to be evaluated at before it is divided, or None: the top one
+        if its f_val is PREDICTED or, at a lower fidelity, within `promote_gap` of curr_opt; else the one for
+        its size if higher than that of its f_val.
+        """
+        if i in self.provisional:
+            return self.top
+        fidelity = self.low.get(i)
+        if fidelity is None:
+            return None
+        if self.rects.f_vals[i] <= self.curr_opt + self.promote_gap * (abs(self.curr_opt) or 1.):
+            return self.top
+        required = self.fidelity_for(self.rects.size[i])
+        return required if required > fidelity else None
+
+    def promote(self, po_rects):
+        """Evaluate f at the centers of the rectangles among `po_rects` selected on a predicted or low fidelity
+        value they are to be promoted from (see `promotion`): they go back to their size classes with their new
+        value, to be divided if selected again. Return the other rectangles, to divide now.
+        """
+        targets  = [self.promotion(po_rect) for po_rect in po_rects]
+        promoted = [po_rect for po_rect, target in zip(po_rects, targets) if target is not None]
+        if not promoted:
+            return po_rects
+        fidelity = np.array([target for target in targets if target is not None])
+        f_vals   = self.evaluate_mixed(self.rects.centers[promoted], fidelity)
+        try:
+            for i, k, f_val in zip(promoted, fidelity.tolist(), f_vals):
+                self.remove_rectangle(i)
+                self.rects.f_vals[i] = f_val
+                self.insert_rectangle(i)
+                self.provisional.discard(i)
+                self.count(k)
+                if k == self.top:
+                    self.low.pop(i, None)
+                    point = self.g2r(self.rects.centers[i])
+                    if self.surrogate is not None and i < self.n_modeled:    # else given with the new rectangles
+                        self.surrogate.add(self.r2u(point), [f_val])
+                        self.modeled.append(i)
+                    self.resolved.append((point, f_val))
+                    if f_val < self.curr_opt:
+                        self.curr_opt, self.x_at_opt = f_val, point
                 else:
-                    self.d_rect[each_rect.d2].append(each_rect)
-        # insert po_rect
-        if po_rect.d2 not in self.d_rect:
-            self.d_rect[po_rect.d2] = [po_rect]
-        elif po_rect.f_val < self.d_rect[po_rect.d2][0].f_val:
-            self.d_rect[po_rect.d2].insert(0, po_rect)
-        else:
-            self.d_rect[po_rect.d2].append(po_rect)
-        # remove empty lists from the dictionary
-        for dd in [key for key in self.d_rect if len(self.d_rect[key]) == 0]:
-            self.d_rect.pop(dd)
-
-    def calc_lbound(self, border):
-        lb     = np.zeros(len(border))
-        border = np.array(border)
-        for i in range(len(border)):
-            tmp_rects = [j for j, val in enumerate(border[:,0]) if val < border[i,0]]
-            if len(tmp_rects):
-                lb[i] = max((border[i,1] - border[tmp_rects,1])/(border[i,0] - border[tmp_rects,0]))
-            else:    lb[i] = -1.976e14
-        return lb
-
-    def calc_ubound(self, border):
-        ub     = np.zeros(len(border))
-        border = np.array(border)
-        for i in range(len(border)):
-            tmp_rects    = [j for j, val in enumerate(border[:,0]) if val > border[i,0]]    # size, f_val
-            if len(tmp_rects):
-                ub[i]    = min((border[tmp_rects,1] - border[i,1])/(border[tmp_rects,0] - border[i,0]))    # d(f_val)/d(size)
-            else:   ub[i] = 1.976e14
-        return ub
+                    self.low[i] = k
+                self.check_termination()
+                if self.TERMINATE:
+                    break
+        finally:
+            f_vals.close()
+        return [po_rect for po_rect, target in zip(po_rects, targets) if target is None]
+
+    def insert_rectangle(self, rect):
+        """Put rectangle `rect` back into its size class."""
+        self.rects.push(rect)
+
+    def remove_rectangle(self, rect):
+        """Take rectangle `rect` out of its size class."""
+        self.rects.take(rect)
+
+    def calc_hull(self, size, f_val):
+        """Return the indices of the points on the lower convex hull of (size, f_val), sorted by size.
+        Monotone-chain scan; points on a hull edge are kept, as in the original lbound <= ubound test.
+        """
+        size, f_val = list(size), list(f_val)    # scalar indexing is faster on lists
+        hull = []
+        for i in range(len(size)):
+            while len(hull) >= 2 and ((f_val[hull[-1]] - f_val[hull[-2]])/(size[hull[-1]] - size[hull[-2]])
+                                      > (f_val[i] - f_val[hull[-1]])/(size[i] - size[hull[-1]])):
+                hull.pop()
+            hull.append(i)
+        return np.array(hull)
 
     def get_potentially_optimal_rects(self):
-        border   = [(key, l[0].f_val) for key, l in self.d_rect.items()]    # border=[(d2, f_val)], d_rect={d2: Rectangle(c, f_val, s)}
-        border   = sorted(border, key=lambda t:t[0])    # sort based on size, then f_val
-        l_po_key = []    # store sizes
-        final_l_po_key = []
-        for i in range(len(border)):
-            l_po_key.append(border[i][0])
-        lbound   = self.calc_lbound(border)
-        ubound   = self.calc_ubound(border)
-        maybe_po = [i for i in range(len(border)) if lbound[i] <= ubound[i]]    # indices of hull satisfying first condition
-        po = [] # indices of hull satisfying second condition
-        for j in range(len(maybe_po)):
-            if self.curr_opt:
-                cond = (self.curr_opt - border[maybe_po[j]][1] + border[maybe_po[j]][0]*ubound[maybe_po[j]])/abs(self.curr_opt)
-                if cond >= self.epsilon:    po.append(j)
-            else:
-                cond = border[maybe_po[j]][-1] - border[maybe_po[j]][0]*ubound[maybe_po[j]]
-                if cond <= 0:   po.append(j)
-        for i in range(len(po)):
-            final_l_po_key.append(l_po_key[maybe_po[po[i]]])
-        return [self.d_rect[key][0] for key in final_l_po_key]    # return rectangles
+        """Return the indices of the rectangles to divide in this iteration, chosen by `selection`."""
+        return self.selection.select(self)
 
-    def u2l(self, unit_coord):
-        real = (unit_coord * 32.).astype(int).tolist()
-        return _hilbert.coordinates_to_distance(real, self.bits, self.D)
+    def select_on_hull(self, size, f_val):
+        """Return the indices of the potentially optimal points among (size, f_val), sorted by size: those on
+        the lower right convex hull passing the epsilon test against curr_opt. With a `local` search the test
+        is against the best rectangle instead, so refining the incumbent does not change the division.
+        """
+        curr_opt = self.curr_opt if self.local is None else self.rects.f_vals[:len(self.rects)].min()
+        hull     = self.calc_hull(size, f_val)
+        # slopes to the neighbouring hull vertices bound the rate of change, d(f_val)/d(size)
+        slope    = (f_val[hull[1:]] - f_val[hull[:-1]])/(size[hull[1:]] - size[hull[:-1]])
+        lbound   = np.concatenate(([-1.976e14], slope))
+        ubound   = np.concatenate((slope, [1.976e14]))
+        maybe_po = lbound <= ubound    # hull vertices satisfying first condition
+        hull, ubound = hull[maybe_po], ubound[maybe_po]
+        if curr_opt:
+            po = (curr_opt - f_val[hull] + size[hull]*ubound)/abs(curr_opt) >= self.epsilon
+        else:
+            po = f_val[hull] - size[hull]*ubound <= 0
+        return hull[po]
+
+    def hilbert_level(self):
+        """Return the deepest trisection level of the unit interval in hilbert mode: that of the shortest
+        intervals no shorter than a cell of the curve, 3^-level >= 1/N. The centers of such intervals are
+        at least a cell apart, so no cell is evaluated twice.
+        """
+        level = 0
+        while level < MAX_LEVEL and 3 ** (level + 1) <= self.N:
+            level += 1
+        return level
+
+    def g2u(self, grid_coord):
+        """grid to unit: map integer lattice coordinates to a coordinate in unit hyper-cube"""
+        return grid_coord / LATTICE
+
+    def g2l(self, grid_coord):
+        """grid to line: map lattice coordinates on the unit interval to positions on the Hilbert curve"""
+        l = [int(t) * self.N // LATTICE for t in np.ravel(grid_coord)]    # exact, N may exceed 2^64
+        if self.bits * self.D <= 64:
+            return np.array(l, dtype=np.uint64)
+        if len(l) < 32:    # ints, for the scalar transforms
+            return l
+        return _hilbert.ints_to_keys(l, self.bits, self.D)    # multi-word keys, (n, words)
+
+    def g2r(self, grid_coord):
+        """grid to real: map integer lattice coordinates to a coordinate in the actual rectangle"""
+        if self.mode == 'hilbert':
+            return self.l2r(self.g2l(grid_coord)).reshape(np.shape(grid_coord)[:-1] + (self.D,))
+        return self.u2r(self.g2u(grid_coord))
+
+    def r2u(self, real_coord):
+        """real to unit: map a coordinate in the actual rectangle to one in unit hyper-cube"""
+        return (real_coord - self.shift) / self.scale
 
     def u2r(self, unit_coord):
         """unit to real: map a coordinate in unit hyper-cube to one in the actual rectangle"""
         return unit_coord * self.scale + self.shift
 
+    def u2l(self, unit_coord):
+        """unit to line: map coordinates in unit hyper-cube to positions of their cells on the Hilbert curve"""
+        coord = np.minimum((np.asarray(unit_coord) * 2 ** self.bits).astype(np.int64), 2 ** self.bits - 1)
+        if coord.ndim == 1:
+            return _hilbert.coordinates_to_distance(coord.tolist(), self.bits, self.D)
+        wide = self.bits * self.D > 64    # multi-word keys, (n, words)
+        if len(coord) >= 32:    # batch transforms pay off from a few dozen points
+            if wide:
+                return _hilbert.coordinates_to_keys(coord, self.bits, self.D)
+            return _hilbert.coordinates_to_distances(coord, self.bits, self.D)
+        l = [_hilbert.coordinates_to_distance(x, self.bits, self.D) for x in coord.tolist()]
+        return _hilbert.ints_to_keys(l, self.bits, self.D) if wide else np.array(l, dtype=np.uint64)
+
     def l2u(self, l):
-        #TODO: make scale and shift generic for all dimensions
-        #TODO: what if bits*D is not even :(
-        """line to unit: map a position on the Hilbert curve to a coordinate in unit hyper-cube"""
-        coord = np.array(_hilbert.distance_to_coordinates(l, self.bits, self.D))
-        return coord / 32.
+        """line to unit: map position(s) on the Hilbert curve to the center(s) of their cells in unit hyper-cube"""
+        if np.ndim(l) == 0:
+            coord = np.array(_hilbert.distance_to_coordinates(int(l), self.bits, self.D))
+        elif len(l) < 32:    # batch transforms pay off from a few dozen points
+            l     = _hilbert.keys_to_ints(l) if np.ndim(l) == 2 else l    # multi-word keys (n, words)
+            coord = np.array([_hilbert.distance_to_coordinates(int(k), self.bits, self.D) for k in l])
+            coord = coord.reshape(len(l), self.D)
+        elif self.bits * self.D > 64:    # multi-word keys (n, words), or a list of ints
+            keys  = l if np.ndim(l) == 2 else _hilbert.ints_to_keys(l, self.bits, self.D)
+            coord = _hilbert.keys_to_coordinates(keys, self.bits, self.D)
+        else:
+            coord = _hilbert.distances_to_coordinates(l, self.bits, self.D)
+        return (coord + 0.5) / 2 ** self.bits
 
     def l2r(self, l):
         """line to real: map a position on the Hilbert curve to a coordinate in the actual rectangle"""
         return self.u2r(self.l2u(l))
 
-    def run(self, file):
-        s                    = np.array([1.]*self.D)    # rectangle sides, unit length
-#         l                    = self.N // 2
-        c                    = np.array([0.5]*self.D)
-#         f_val                = self.f_wrap(self.l2r(l))
-        f_val                = self.f_wrap(self.u2r(c))
-#         self.x_at_opt        = self.l2r(l)
-        self.x_at_opt        = self.u2r(c)
-#         rect                 = Rectangle(l, f_val, s)
-        rect                 = Rectangle(c, f_val, s)
-        self.d_rect[rect.d2] = [rect]
+    def init_search(self, f_val):
+        """Start from the unit hyper-cube, with `f_val` the value of f at its center."""
+        s                    = np.zeros(self.rects.D, dtype=np.uint8)    # trisection levels, unit length sides
+        c                    = np.full(self.rects.D, LATTICE // 2)    # l = N // 2 in hilbert mode
+        self.x_at_opt        = self.g2r(c)
+        self.rects.add(c, f_val, s)
         self.curr_opt        = f_val
+
+    def notify(self, n_po):
+        """Give the stats of the iteration just done, which divided `n_po` rectangles, to the observers.
+        In `arun` an iteration is a selection, and its divisions may still be in progress.
+        """
+        stats = dict(iter      = self.n_iter,
+                     n_po      = n_po,
+                     n_classes = len(self.rects.classes),
+                     n_rects   = len(self.rects),
+                     n_feval   = self.n_feval,
+                     n_real    = self.n_real,
+                     cost      = self.cost,
+                     n_rectdiv = self.n_rectdiv,
+                     curr_opt  = float(self.true_sign(self.curr_opt)),
+                     x_at_opt  = np.asarray(self.x_at_opt, dtype=float).tolist())
+        if self.profiler is not None:
+            stats['times'] = dict(self.profiler.times)
+        for observer in self.observers:
+            observer(stats)
+
+    def refine(self):
+        """Run the `local` search from the center of the best rectangle, within that rectangle. Its evaluations
+        count in n_feval and improve curr_opt and x_at_opt, but do not create rectangles.
+        Return the points evaluated (real coordinates) and their f values.
+        """
+        i       = int(np.argmin(self.rects.f_vals[:len(self.rects)]))
+        half    = LATTICE // 2 // 3 ** self.rects.levels[i].astype(np.int64)
+        lower   = self.g2r(self.rects.centers[i] - half)
+        upper   = self.g2r(self.rects.centers[i] + half)
+        search  = self.local.search(self.g2r(self.rects.centers[i]), self.rects.f_vals[i], lower, upper)
+        budget  = self.local.budget or 20 * self.D
+        points, f_vals = [], []
+        try:
+            x = next(search)
+            while len(points) < budget:
+                f_val = self.f_wrap(x[np.newaxis, :])[0] if self.vectorized else self.f_wrap(x)
+                points.append(x)
+                f_vals.append(f_val)
+                if f_val < self.curr_opt:
+                    self.curr_opt, self.x_at_opt = f_val, x
+                self.n_feval += 1
+                self.count(self.top)
+                self.check_termination()
+                if self.TERMINATE:
+                    break
+                x = search.send(f_val)
+        except StopIteration:
+            pass
+        finally:
+            search.close()
+        self.local_opt = self.curr_opt
+        return np.array(points).reshape(len(points), self.D), np.array(f_vals, dtype=float)
+
+    def spatial_index(self):
+        """Return the HilbertIndex of the rectangle centers (unit coordinates, ids the rectangle indices),
+        adding those of the rectangles created since the last query.
+        """
+        if self.index is None:
+            self.index = HilbertIndex(self.D)
+        n = len(self.rects)
+        if len(self.index) < n:
+            new = np.arange(len(self.index), n)
+            self.index.add(self.r2u(self.g2r(self.rects.centers[new])).reshape(len(new), self.D), new)
+        return self.index
+
+    def nearest(self, x, k=1):
+        """Return the indices of the `k` rectangles whose centers are nearest `x` (real coordinates), nearest
+        first, and their distances in the unit hyper-cube.
+        """
+        return self.spatial_index().nearest(self.r2u(np.asarray(x, dtype=float)), k)
+
+    def evaluated_in(self, lower, upper):
+        """Return the indices of the rectangles whose centers are within the box [lower, upper] (real coordinates)."""
+        return self.spatial_index().box(self.r2u(np.asarray(lower, dtype=float)),
+                                        self.r2u(np.asarray(upper, dtype=float)))
+
+    def optima(self, n=3, radius=0.1):
+        """Return the centers (real coordinates) and f values of up to `n` distinct local optima: the best
+        rectangle centers at least `radius` apart in the unit hyper-cube, best first. Values predicted by the
+        surrogate or at a lower fidelity are left out.
+        """
+        index  = self.spatial_index()
+        f_vals = self.rects.f_vals[:len(self.rects)]
+        taken  = np.zeros(len(f_vals), dtype=bool)
+        taken[list(self.provisional) + list(self.low)] = True
+        best   = []
+        for i in np.argsort(f_vals, kind='stable').tolist():
+            if len(best) == n:
+                break
+            if taken[i]:
+                continue
+            best.append(i)
+            taken[index.ball(self.r2u(self.g2r(self.rects.centers[i])), radius)[0]] = True
+        best = np.array(best, dtype=np.int64)
+        return self.g2r(self.rects.centers[best]).reshape(len(best), self.D), self.true_sign(f_vals[best])
+
+    def start_clock(self):
+        """Fix the end of the search `deadline` seconds from now, on the first call."""
+        if self.deadline is not None and self.end_time is None:
+            self.end_time = time.monotonic() + self.deadline
+
+    def time_evaluations(self, start, n_feval):
+        """Account in the moving average `eval_time` for the evaluations since `n_feval`, begun at `start`."""
+        if self.n_feval > n_feval:
+            per_eval = (time.monotonic() - start) / (self.n_feval - n_feval)
+            self.eval_time = per_eval if self.eval_time is None else \
+                (1 - EVAL_TIME_WEIGHT) * self.eval_time + EVAL_TIME_WEIGHT * per_eval
+
+    def affordable(self, po_rects):
+        """Return the rectangles among `po_rects` whose divisions are expected to end before the deadline, at
+        `eval_time` per evaluation: all of them if they fit, else the best ones that do, in their order. So no
+        batch of evaluations is started that cannot finish in time; with none left the search ends, see
+        `divide_rectangles`.
+        """
+        if self.end_time is None or self.eval_time is None or not po_rects:
+            return po_rects
+        n_evals = [2 * len(self.division.sides(self.rects.levels[i])) for i in po_rects]
+        left    = int((self.end_time - time.monotonic()) / self.eval_time)
+        if sum(n_evals) <= left:
+            return po_rects
+        keep = set()
+        for k in np.argsort(self.rects.f_vals[po_rects], kind='stable').tolist():
+            if n_evals[k] <= left:
+                keep.add(k)
+                left -= n_evals[k]
+        if not keep:
+            self.stop('deadline')
+        return [po_rect for k, po_rect in enumerate(po_rects) if k in keep]
+
+    def check_resolution(self, po_rects):
+        """Return `po_rects` to divide, or none if the smallest of them has a d2 below `d2_tol`: on a problem
+        of unknown optimum the search has then converged to the resolution asked for, and stops.
+        """
+        if self.d2_tol is None or self.globalmin.known or not po_rects:
+            return po_rects
+        if self.rects.d2(self.rects.size[po_rects]).min() < self.d2_tol:
+            self.stop('d2')
+            return []
+        return po_rects
+
+    def large_volume(self):
+        """Return the fraction of the unit hyper-cube in the rectangles with d2 above `large_d2`. It is counted
+        from the sizes of all the rectangles, including those pruned from their size classes.
+        """
+        count = np.bincount(self.rects.size[:len(self.rects)])
+        sizes = np.flatnonzero(count)
+        large = sizes[self.rects.d2(sizes) > self.large_d2]
+        return float((count[large] * 3. ** -large.astype(float)).sum())
+
+    def check_convergence(self):
+        """On a problem of unknown optimum, stop once curr_opt has not improved by more than `stall_tol`
+        (relative) for `stall_iter` iterations, or less than `volume_tol` of the volume is left in the
+        rectangles with d2 above `large_d2`, every other region being explored at that resolution.
+        """
+        if self.globalmin.known or self.TERMINATE:
+            return
+        if self.stall_iter is not None:
+            if (self.stall_opt - self.curr_opt > self.stall_tol * (abs(self.stall_opt) or 1.)
+                    or not np.isfinite(self.stall_opt)):
+                self.stall_opt, self.stall_since = self.curr_opt, self.n_iter
+            elif self.n_iter - self.stall_since >= self.stall_iter:
+                self.stop('stall')
+        if self.large_d2 is not None and self.large_volume() < self.volume_tol:
+            self.stop('volume')
+
+    def max_takes(self):
+        """Return a bound on the rectangles still to be taken from any one size class before the budget is
+        used up: each iteration takes at most one per class, and only starts if the divisions so far,
+        2 evaluations and 1 rectdiv each at least, left some budget. At least 1, as the budget may be overrun.
+        An iteration may instead only promote rectangles (see `promote`): 1 evaluation, at the cheapest cost.
+        """
+        promoting = self.surrogate is not None or self.top
+        bounds    = [self.max_iter - self.n_iter + 1]
+        if self.max_cost is not None:
+            n_eval = int((self.max_cost - self.cost) // min(fidelity.cost for fidelity in self.fidelities))
+            bounds.append(n_eval + 1 if promoting else n_eval // 2 + 1)
+        elif not promoting:
+            bounds.append((self.max_feval - self.n_feval) // 2 + 1)
+        if not promoting:
+            bounds.append(self.max_rectdiv - self.n_rectdiv + 1)
+        return 1 + max(0, min(bounds))
+
+    def snapshot(self, n_rects, local=None):
+        """Return the Snapshot of the search, with the points evaluated since the store held `n_rects` rectangles:
+        the centers of the rectangles created since, those evaluated for a rectangle left undivided, those of
+        the rectangles `promote`d and the (points, f_vals) of a `local` search. Only values of f at the top
+        fidelity are given, those predicted by the surrogate or at a lower fidelity are left out.
+        """
+        centers, f_vals = self.rects.centers[n_rects:len(self.rects)], self.rects.f_vals[n_rects:len(self.rects)]
+        if self.partial:
+            centers = np.concatenate((centers, self.trisect(self.pending[0])[1][:len(self.partial)]))
+            f_vals  = np.concatenate((f_vals, self.partial))
+        if self.surrogate is not None or self.top:
+            top = [i not in self.provisional and i not in self.low for i in range(n_rects, len(self.rects))]
+            top = np.array(top + [k == self.top for k in self.partial_fidelity], dtype=bool)
+            centers, f_vals = centers[top], f_vals[top]
+        points = self.g2r(centers).reshape(len(centers), self.D)
+        if self.resolved:
+            points = np.concatenate((points, [point for point, _ in self.resolved]))
+            f_vals = np.concatenate((f_vals, [f_val for _, f_val in self.resolved]))
+        if local is not None:
+            points, f_vals = np.concatenate((points, local[0])), np.concatenate((f_vals, local[1]))
+        return Snapshot(self.n_iter, self.n_feval, self.true_sign(self.curr_opt), self.x_at_opt,
+                        points, self.true_sign(np.array(f_vals)))
+
+    def iterate(self):
+        """Run DIRECT one iteration at a time, yielding a Snapshot after each one (and after the first
+        evaluation, as iteration 0). Closing the generator stops the search between iterations; a new call
+        continues it from there, so searches can be interleaved cooperatively or stopped on any criterion.
+        """
+        self.start_clock()
+        if not len(self.rects):
+            start = time.monotonic()
+            self.init_search(next(self.evaluate(np.full((1, self.rects.D), LATTICE // 2))))
+            self.time_evaluations(start, 0)
+            yield self.snapshot(0)
+        elif self.pending and not self.TERMINATE:    # resumed in the middle of an iteration
+            n_rects = len(self.rects)
+            self.divide_rectangles(self.pending)
+            yield self.snapshot(n_rects)
         while not self.TERMINATE and (self.globalmin.known or self.n_iter <= self.max_iter):
+            if self.prune and not self.globalmin.known:
+                self.rects.prune(self.max_takes())
             self.n_iter += 1
-            for po_rect in self.get_potentially_optimal_rects():    # select potentially optimal rectangles
-                if not self.TERMINATE:
-                    # identify longest side(s) of po_rect
-                    # evaluate the f(new c)s
-                    # divide po_rect into smaller rectangles
-                    # update curr_opt, x_at_opt, n_feval
-                    self.divide_rectangle(po_rect)
+            n_rects = len(self.rects)
+            self.resolved = []
+            # select potentially optimal rectangles, evaluate the f(new c)s and divide them
+            start, n_feval = time.monotonic(), self.n_feval
+            po_rects = self.check_resolution(self.affordable(self.get_potentially_optimal_rects()))
+            self.divide_rectangles(po_rects)
+            self.time_evaluations(start, n_feval)
+            if self.rects.max_entries is not None:
+                self.rects.spill_cold()
+            local = None
+            if (self.local is not None and not self.TERMINATE and self.n_iter % self.local.every == 0
+                    and self.curr_opt < self.local_opt):    # a new rectangle improved the incumbent
+                local = self.refine()
+            self.check_convergence()
+            if self.observers:
+                self.notify(len(po_rects))
+            if self.checkpoint_every and self.n_feval - self.n_feval_saved >= self.checkpoint_every:
+                self.save_checkpoint(self.checkpoint)
+            yield self.snapshot(n_rects, local)
+        if not self.TERMINATE:
+            self.stop_reason = 'max_iter'
+        if self.checkpoint:
+            self.save_checkpoint(self.checkpoint)
+
+    def run(self, file):
+        """Run DIRECT until a stopping condition is met.
+        :param file: text file the stats of each iteration are written to as JSON lines, or None
+        """
+        if file is not None:
+            self.observers.append(JsonlTrace(file))
+        try:
+            for _ in self.iterate():
+                pass
+        finally:
+            if file is not None:
+                self.observers.pop()
+                file.flush()
 
         print("number of function evaluations =", self.n_feval)
-#         file.write("number of function evaluations = " + str(self.n_feval) + "\n")
+        if self.surrogate is not None or self.top:
+            print("number of real evaluations =", self.n_real, ", per fidelity =", self.n_evals, ", cost =", self.cost)
+        print("stop reason =", self.stop_reason)
         opt, x = self.true_sign(self.curr_opt), self.x_at_opt
         print("optimum =", opt, ", x =", x, "\n")
-#         file.write("optimum = " + str(opt) + ",  x = " + str(x) + "\n\n")
\ No newline at end of file
+
+    def save_checkpoint(self, path):
+        """Save the full optimizer state to `path` as columnar arrays in a .npz file, replacing it atomically."""
+        n     = len(self.rects)
+        state = dict(bounds      = np.stack((self.shift, self.shift + self.scale), axis=1),
+                     centers     = self.rects.centers[:n],
+                     levels      = self.rects.levels[:n],
+                     f_vals      = self.rects.f_vals[:n],
+                     pending     = np.array(self.pending, dtype=np.int64),
+                     partial     = np.array(self.partial, dtype=float),
+                     curr_opt    = self.curr_opt,
+                     x_at_opt    = self.x_at_opt,
+                     local_opt   = self.local_opt,
+                     counters    = np.array([self.n_feval, self.n_rectdiv, self.n_iter, self.n_cache_hits,
+                                             self.n_real, self.n_modeled]),
+                     provisional = np.array(sorted(self.provisional), dtype=np.int64),
+                     partial_fidelity = np.array(self.partial_fidelity, dtype=np.int64),
+                     low         = np.array(sorted(self.low.items()), dtype=np.int64).reshape(-1, 2),
+                     n_evals     = np.array(self.n_evals),
+                     cost        = self.cost,
+                     stall       = np.array([self.stall_since, self.stall_opt]),
+                     modeled     = np.array(self.modeled, dtype=np.int64),
+                     screened    = np.array([] if self.screened is None else self.screened, dtype=float),
+                     params      = np.array([self.epsilon, self.max_feval, self.max_iter, self.max_rectdiv,
+                                             self.tolerance, self.bits], dtype=float),
+                     globalmin   = np.array([self.globalmin.minimize, self.globalmin.known,
+                                             np.nan if self.globalmin.value is None else self.globalmin.value]),
+                     mode        = np.array(self.mode))
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as file:
+            np.savez(file, **state)
+        os.replace(tmp, path)
+        self.n_feval_saved = self.n_feval
+
+    @classmethod
+    def resume(cls, path, f, **kwargs):
+        """Rebuild an optimizer from a checkpoint written by `save_checkpoint`; `run` then continues it exactly.
+        :param kwargs: parameters to change, e.g. a larger max_feval or max_iter, and the options not saved
+                       with the state (vectorized, executor, cache, checkpoint, checkpoint_every, profile,
+                       selection, division, local, prune, spill, max_entries, surrogate, max_cost,
+                       promote_gap, deadline, stall_iter, stall_tol, d2_tol, large_d2,
+                       volume_tol); a surrogate is refitted on the real values restored, in the order it
+                       was given them, and f must be the same list of Fidelity for a multi-fidelity run
+        """
+        with np.load(path) as state:
+            epsilon, max_feval, max_iter, max_rectdiv, tol, bits = state['params'].tolist()
+            minimize, known, value = state['globalmin'].tolist()
+            params = dict(epsilon=epsilon, max_feval=int(max_feval), max_iter=int(max_iter),
+                          max_rectdiv=int(max_rectdiv), tol=tol, bits=int(bits),
+                          globalmin=GlobalMin(bool(minimize), bool(known), None if np.isnan(value) else value),
+                          mode=str(state['mode']))
+            params.update(kwargs)
+            direct = cls(f, state['bounds'], **params)
+            for center, f_val, levels in zip(state['centers'], state['f_vals'], state['levels']):
+                direct.rects.add(center, f_val, levels)
+            direct.pending  = state['pending'].tolist()
+            direct.partial  = state['partial'].tolist()
+            direct.curr_opt = state['curr_opt'][()]
+            direct.x_at_opt = state['x_at_opt']
+            if 'local_opt' in state.files:    # saved since local searches
+                direct.local_opt = state['local_opt'][()]
+            counters = state['counters'].tolist()
+            direct.n_feval, direct.n_rectdiv, direct.n_iter, direct.n_cache_hits = counters[:4]
+            direct.n_real = counters[4] if len(counters) > 4 else direct.n_feval    # saved before surrogates
+            direct.partial_fidelity = [direct.top] * len(direct.partial)
+            if 'provisional' in state.files:
+                direct.provisional = set(state['provisional'].tolist())
+            if 'low' in state.files:    # saved since multi-fidelity objectives
+                direct.partial_fidelity = state['partial_fidelity'].tolist()
+                direct.low      = dict(state['low'].tolist())
+                direct.n_evals  = state['n_evals'].tolist()
+                direct.cost     = state['cost'][()]
+            if 'stall' in state.files:    # saved since the convergence criteria
+                stall_since, direct.stall_opt = state['stall'].tolist()
+                direct.stall_since = int(stall_since)
+            if 'modeled' in state.files and direct.surrogate is not None:    # else refitted in row order
+                direct.modeled   = state['modeled'].tolist()
+                direct.n_modeled = counters[5]
+                if direct.modeled:
+                    centers = direct.rects.centers[direct.modeled]
+                    direct.surrogate.add(direct.r2u(direct.g2r(centers)), direct.rects.f_vals[direct.modeled])
+                if len(state['screened']):
+                    direct.screened = state['screened']
+        direct.n_feval_saved = direct.n_feval
+        if direct.profiler is not None:    # restoring the rectangles is not part of the search
+            direct.profiler.reset()
+        direct.check_termination()
+        direct.check_convergence()
+        return direct
+
+    async def aevaluate(self, center):
+        """Evaluate f at `center` (lattice coordinates), awaiting the result if f is a coroutine function."""
+        f_val = self.cache.get(center) if self.cache is not None else None
+        if f_val is not None:
+            self.n_cache_hits += 1
+            return self.true_sign(f_val)
+        f_val = self.f(self.g2r(center))
+        if inspect.isawaitable(f_val):
+            f_val = await f_val
+        if self.cache is not None:
+            self.cache.put(center, f_val)
+        return self.true_sign(f_val)
+
+    async def adivide_rectangle(self, po_rect, maxlen_sides, centers, slots):
+        """Evaluate the new `centers` of `po_rect` (counted in n_pending already) concurrently, then divide it.
+        `po_rect` is out of its size class meanwhile; it goes back undivided if the search stops first.
+        """
+        async def evaluate(center):
+            try:
+                async with slots:
+                    f_val = await self.aevaluate(center)
+            finally:
+                self.n_pending -= 1
+            if not self.TERMINATE:    # stopping conditions are checked as each result arrives
+                self.update_opt(center, f_val)
+            return f_val
+
+        try:
+            f_vals = await asyncio.gather(*[evaluate(center) for center in centers])
+        except asyncio.CancelledError:
+            self.insert_rectangle(po_rect)
+            raise
+        if self.TERMINATE:
+            self.insert_rectangle(po_rect)
+        else:
+            self.split_rectangle(po_rect, maxlen_sides, centers, f_vals)
+
+    async def arun(self, max_pending=8):
+        """Run DIRECT on an objective that may be a coroutine function, without a barrier between iterations.
+        Up to `max_pending` evaluations are in flight. At the start and each time divisions complete, if fewer
+        are pending, the potentially optimal rectangles among those not being divided are selected and their
+        divisions started, until `max_pending` is reached; the others stay in their size classes. Each such
+        selection counts as one iteration, for max_iter and the convergence criteria alike.
+        """
+        assert self.surrogate is None, "arun evaluates every new center, without surrogate screening"
+        assert not self.top, "arun evaluates f at a single fidelity"
+        assert self.local is None, "arun has no iteration end to run a local search at"
+        assert not self.prune, "arun takes rectangles out of their size classes while others are divided"
+        self.start_clock()
+        self.init_search(await self.aevaluate(np.full(self.rects.D, LATTICE // 2)))
+        slots          = asyncio.Semaphore(max_pending)
+        self.n_pending = 0
+        dividing       = set()
+        try:
+            while not self.TERMINATE:
+                # select again only once results came back, so that each selection sees new divisions
+                if (self.n_pending < max_pending and self.rects.classes
+                        and (self.globalmin.known or self.n_iter <= self.max_iter)):
+                    self.n_iter += 1
+                    n_po = 0
+                    for po_rect in self.check_resolution(self.get_potentially_optimal_rects()):
+                        if self.n_pending >= max_pending:
+                            break
+                        self.remove_rectangle(po_rect)
+                        maxlen_sides, centers = self.trisect(po_rect)
+                        self.n_pending += len(centers)    # counted now, the division only starts at the next tick
+                        dividing.add(asyncio.ensure_future(self.adivide_rectangle(po_rect, maxlen_sides, centers, slots)))
+                        n_po += 1
+                    self.check_convergence()
+                    if self.observers:
+                        self.notify(n_po)
+                if not dividing:
+                    break
+                done, dividing = await asyncio.wait(dividing, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+        finally:
+            for task in dividing:
+                task.cancel()
+            await asyncio.gather(*dividing, return_exceptions=True)
+        if not self.TERMINATE:
+            if self.rects.classes:
+                self.stop_reason = 'max_iter'
+            else:    # every rectangle is at its deepest level
+                self.stop('max_level')
@@ -184,4 +184,144 @@ def func11(x, nopt=4):
     Global Optimum: origin, at (1,...,1)
     '''
     f = 418.9829*nopt + np.sum(-x * np.sin(np.sqrt(abs(x))))
-    return f
\ No newline at end of file
+    return f
+
+# Batch versions: X holds one point per row, shape (n, D), and the values are returned as shape (n,).
+
+def _points(X, ndim, name):
+    X = np.asarray(X, dtype=float)
+    if X.ndim != 2 or X.shape[1] != ndim:
+        raise ValueError("%s expects points of dimension %d, shape (n, %d), got shape %s"
+                         % (name, ndim, ndim, X.shape))
+    return X
+
+
+def func1_batch(X):
+    '''
+    This is the Goldstein-Price function, batch version of func1
+    '''
+    x1, x2 = _points(X, 2, 'func1_batch').T
+    u1 = (x1 + x2 + 1.0)**2
+    u2 = 19. - 14.*x1 + 3.*x1**2 - 14.*x2 + 6.*x1*x2 +3.*x2**2
+    u3 = (2.*x1 - 3.*x2)**2
+    u4 = 18. - 32.*x1 + 12.*x1**2 + 48.*x2 -36.*x1*x2 + 27.*x2**2
+    return (1. + u1 * u2) * (30. + u3 * u4)
+
+
+def func2_batch(X, a=100.0):
+    '''
+    This is the Rosenbrock function, batch version of func2
+    '''
+    x1, x2 = _points(X, 2, 'func2_batch').T
+    return a * (x2 - x1**2)**2 + (1 - x1)**2
+
+
+def func3_batch(X):
+    '''
+    This is the Six-hump Camelback function, batch version of func3
+    '''
+    x1, x2 = _points(X, 2, 'func3_batch').T
+    return (4 - 2.1*x1**2 + x1**4/3)*x1**2 + x1*x2 + (-4 + 4*x2**2)*x2**2
+
+
+def func4_batch(X):
+    '''
+    This is the Rastrigin function, batch version of func4
+    '''
+    x1, x2 = _points(X, 2, 'func4_batch').T
+    return x1**2 + x2**2 - np.cos(18.0*x1) - np.cos(18.0*x2)
+
+
+def func5_batch(X, nopt=10):
+    '''
+    This is the Griewank function, batch version of func5; X must have nopt columns
+    '''
+    X = _points(X, nopt, 'func5_batch with nopt=%d' % nopt)
+    d = 200.0 if nopt==2 else 4000.0
+    u1 = np.sum(X**2/d, axis=1)
+    u2 = np.prod(np.cos(X/np.sqrt(np.arange(1., nopt+1))), axis=1)
+    return u1 - u2 + 1
+
+
+def func6_batch(X, nopt=3):
+    '''
+    This is the Hartmann function, batch version of func6; nopt is 3 or 6, the number of columns of X
+    '''
+    if nopt not in (3, 6):
+        raise ValueError("func6_batch is defined for nopt=3 or nopt=6, got nopt=%d" % nopt)
+    X = _points(X, nopt, 'func6_batch with nopt=%d' % nopt)
+    alpha = np.array([1., 1.2, 3., 3.2])
+    if nopt==6:
+        A = np.array([[10, 3, 17, 3.5, 1.7, 8],
+                      [0.05, 10, 17, 0.1, 8, 14],
+                      [3, 3.5, 1.7, 10, 17, 8],
+                      [17, 8, 0.05, 10, 0.1, 14]])
+        P = 1e-4 * np.array([[1312, 1696, 5569, 124, 8283, 5886],
+                             [2329, 4135, 8307, 3736, 1004, 9991],
+                             [2348, 1451, 3522, 2883, 3047, 6650],
+                             [4047, 8828, 8732, 5743, 1091, 381]])
+    else:
+        A = np.array([[3.0, 10, 30],
+                      [0.1, 10, 35],
+                      [3.0, 10, 30],
+                      [0.1, 10, 35]])
+        P = 1e-4 * np.array([[3689, 1170, 2673],
+                             [4699, 4387, 7470],
+                             [1091, 8732, 5547],
+                             [381, 5743, 8828]])
+    u2 = np.sum(A * (X[:, None, :] - P)**2, axis=2)    # (n, 4)
+    u1 = np.sum(alpha**(-u2), axis=1)
+    if nopt==6:
+        return -(2.58 + u1) / 1.94
+    return -u1
+
+
+def func7_batch(X, a=1, b=5.1/(4*np.pi**2), c=5/np.pi, r=6, s=10, t=1/(8*np.pi)):
+    '''
+    This is the Branin function, batch version of func7
+    '''
+    x1, x2 = _points(X, 2, 'func7_batch').T
+    return a * (x2 - b*x1**2 + c*x1 - r)**2 + s*(1-t)*np.cos(x1) + s
+
+
+def func8_batch(X, m=5):
+    '''
+    This is the Shekel function, batch version of func8; m is at most 10
+    '''
+    if not 1 <= m <= 10:
+        raise ValueError("func8_batch is defined for 1 <= m <= 10, got m=%d" % m)
+    X = _points(X, 4, 'func8_batch')
+    b = 0.1 * np.array([1, 2, 2, 4, 4, 6, 3, 7, 5, 5])
+    C = np.array([[4., 1., 8., 6., 3., 2., 5., 8., 6., 7.],
+                  [4., 1., 8., 6., 7., 9., 3., 1., 2., 3.6],
+                  [4., 1., 8., 6., 3., 2., 5., 8., 6., 7.],
+                  [4., 1., 8., 6., 7., 9., 3., 1., 2., 3.6]])
+    u2 = np.sum((X[:, :, None] - C[:, :m])**2, axis=1)    # (n, m)
+    return -np.sum(1/(u2 + b[:m]), axis=1)
+
+
+def func9_batch(X):
+    '''
+    This is the Shubert function, batch version of func9
+    '''
+    X = _points(X, 2, 'func9_batch')
+    i = np.arange(1, 6)
+    u = np.sum(i * np.cos((i+1) * X[:, :, None] + i), axis=2)    # (n, 2)
+    return u[:, 0] * u[:, 1]
+
+
+def func10_batch(X, nopt=5):
+    '''
+    This is the Michalewics function, batch version of func10; X must have nopt columns
+    '''
+    X = _points(X, nopt, 'func10_batch with nopt=%d' % nopt)
+    i = np.arange(nopt)
+    return -np.sum(np.sin(X) * (np.sin((i+1) * X**2/np.pi)) ** (2*nopt), axis=1)
+
+
+def func11_batch(X, nopt=4):
+    '''
+    This is the Schwefel function, batch version of func11; X must have nopt columns
+    '''
+    X = _points(X, nopt, 'func11_batch with nopt=%d' % nopt)
+    return 418.9829*nopt + np.sum(-X * np.sin(np.sqrt(abs(X))), axis=1)
@@ -0,0 +1,238 @@
+import collections
+import multiprocessing
+import queue
+import select
+import socket
+import struct
+import threading
+import time
+import traceback
+
+import numpy as np
+
+
+# Every message is a header: kind, request id, rows, columns; then rows x columns little-endian float64
+# values, or for ERROR the utf-8 text of `rows` bytes. The client sends EVAL (points, one per row) and
+# PING; the worker answers RESULT (one value per row), ERROR (f raised) and PONG, in any order.
+HEADER = struct.Struct('>cQII')
+EVAL, RESULT, ERROR, PING, PONG = b'E', b'R', b'X', b'P', b'O'
+
+
+class RemoteError(RuntimeError):
+    """The objective raised on a worker; its traceback is the message."""
+
+
+def send_message(sock, kind, ident, values=None):
+    if kind == ERROR:
+        payload = values.encode()
+        sock.sendall(HEADER.pack(kind, ident, len(payload), 0) + payload)
+    elif values is None:
+        sock.sendall(HEADER.pack(kind, ident, 0, 0))
+    else:
+        values = np.ascontiguousarray(values, dtype='<f8')
+        values = values.reshape(len(values), -1)
+        sock.sendall(HEADER.pack(kind, ident, *values.shape) + values.tobytes())
+
+
+def recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def recv_message(sock):
+    """Return the next message on `sock` as (kind, ident, values), values being an array, a str or None."""
+    kind, ident, rows, columns = HEADER.unpack(recv_exact(sock, HEADER.size))
+    if kind == ERROR:
+        return kind, ident, recv_exact(sock, rows).decode()
+    if kind in (PING, PONG):
+        return kind, ident, None
+    values = np.frombuffer(recv_exact(sock, rows * columns * 8), dtype='<f8').reshape(rows, columns)
+    return kind, ident, values
+
+
+def serve(f, host='127.0.0.1', port=0, vectorized=False, ready=None):
+    """Serve evaluations of `f` to RemoteEvaluator clients on (host, port), forever. Each connection is
+    read by its own thread, which answers PING at once, and evaluated by another, in order of arrival.
+    :param vectorized: f maps a (k, D) array of points to k values in one call, else it is called per point
+    :param ready: called with the port listened on once connections are accepted, e.g. when port is 0
+    """
+    server = socket.create_server((host, port))
+    if ready is not None:
+        ready(server.getsockname()[1])
+    while True:
+        conn, _ = server.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=_handle, args=(conn, f, vectorized), daemon=True).start()
+
+
+def _handle(conn, f, vectorized):
+    lock, requests = threading.Lock(), queue.Queue()
+
+    def evaluate():
+        while True:
+            ident, points = requests.get()
+            if points is None:
+                return
+            try:
+                values, kind = (f(points) if vectorized else [f(point) for point in points]), RESULT
+                values = np.asarray(values, dtype=float).reshape(len(points))
+            except Exception:
+                values, kind = traceback.format_exc(), ERROR
+            try:
+                with lock:
+                    send_message(conn, kind, ident, values)
+            except OSError:
+                return
+
+    evaluator = threading.Thread(target=evaluate, daemon=True)
+    evaluator.start()
+    try:
+        while True:
+            kind, ident, values = recv_message(conn)
+            if kind == PING:
+                with lock:
+                    send_message(conn, PONG, ident)
+            elif kind == EVAL:
+                requests.put((ident, values))
+    except OSError:    # the client went away
+        pass
+    finally:
+        requests.put((None, None))
+        conn.close()
+
+
+def _serve(f, vectorized, ports):
+    serve(f, vectorized=vectorized, ready=ports.put)
+
+
+def spawn_workers(f, n, vectorized=False, context=None):
+    """Start `n` worker processes serving `f` on localhost and return them with their (host, port) addresses.
+    :param f: objective, picklable (a module level function or a functools.partial)
+    """
+    context = multiprocessing.get_context(context)
+    ports   = context.Queue()
+    workers = [context.Process(target=_serve, args=(f, vectorized, ports), daemon=True) for _ in range(n)]
+    for worker in workers:
+        worker.start()
+    return workers, [('127.0.0.1', ports.get(timeout=60)) for _ in workers]
+
+
+class Worker():
+    """Pooled connection to one worker, with the requests sent to it and not yet answered."""
+    def __init__(self, address):
+        self.address     = address
+        self.sock        = None
+        self.dead_since  = None    # time the connection was lost, or could not be made
+        self.outstanding = {}      # request id -> (start, stop) rows of the current batch
+        self.last_heard  = 0.
+        self.last_ping   = 0.
+
+
+class RemoteEvaluator():
+    """Objective evaluating batches of points on remote workers (see `serve`), for Direct(vectorized=True).
+    Each call splits its points into chunks of `batch_size` rows, keeps up to `depth` chunks in flight on
+    every worker and gathers the values back in the order of the points, so a search over workers is the
+    search run serially. Connections are kept open between calls. While waiting, every worker is sent a
+    PING each `heartbeat` seconds; one not heard from for `timeout` seconds, or whose connection breaks,
+    is dead: its chunks are resubmitted to the others, and it is only reconnected after `retry` seconds.
+    Raises ConnectionError if no worker is left, RemoteError if f raised on a worker.
+    """
+    def __init__(self, addresses, batch_size=16, depth=2, heartbeat=1., timeout=10., retry=30.):
+        self.workers    = [Worker(tuple(address)) for address in addresses]
+        self.batch_size = batch_size
+        self.depth      = depth
+        self.heartbeat  = heartbeat
+        self.timeout    = timeout
+        self.retry      = retry
+        self.ident      = 0
+        self.n_resubmitted = 0     # chunks sent again after their worker died
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for worker in self.workers:
+            if worker.sock is not None:
+                worker.sock.close()
+                worker.sock = None
+            worker.outstanding = {}
+
+    def connect(self):
+        """Return the live workers, connecting those not connected, unless they died less than `retry` ago."""
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.sock is None and (worker.dead_since is None or now - worker.dead_since >= self.retry):
+                try:
+                    worker.sock = socket.create_connection(worker.address, timeout=self.timeout)
+                    worker.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    worker.dead_since = None
+                except OSError:
+                    worker.dead_since = now
+        return [worker for worker in self.workers if worker.sock is not None]
+
+    def kill(self, worker, chunks):
+        """Drop the connection to `worker`, putting its outstanding chunks back in `chunks`."""
+        worker.sock.close()
+        worker.sock, worker.dead_since = None, time.monotonic()
+        chunks.extendleft(reversed(list(worker.outstanding.values())))
+        self.n_resubmitted += len(worker.outstanding)
+        worker.outstanding = {}
+
+    def __call__(self, points):
+        points = np.ascontiguousarray(points, dtype=float)
+        points = points.reshape(len(points), -1)
+        values = np.empty(len(points))
+        chunks = collections.deque((start, min(start + self.batch_size, len(points)))
+                                   for start in range(0, len(points), self.batch_size))
+        try:
+            return self.gather(points, values, chunks, self.connect())
+        except BaseException:    # answers still in flight would land in a later call: start afresh
+            self.close()
+            raise
+
+    def gather(self, points, values, chunks, live):
+        while True:
+            for worker in list(live):
+                try:
+                    while chunks and len(worker.outstanding) < self.depth:
+                        start, stop = chunks.popleft()
+                        self.ident += 1
+                        if not worker.outstanding:
+                            worker.last_heard = time.monotonic()
+                        worker.outstanding[self.ident] = (start, stop)
+                        send_message(worker.sock, EVAL, self.ident, points[start:stop])
+                except OSError:
+                    self.kill(worker, chunks)
+                    live.remove(worker)
+            if not chunks and not any(worker.outstanding for worker in live):
+                return values
+            if not live:
+                raise ConnectionError("no worker left of %s" % [worker.address for worker in self.workers])
+            readable, _, _ = select.select([worker.sock for worker in live], [], [], self.heartbeat)
+            now = time.monotonic()
+            for worker in list(live):
+                try:
+                    if worker.sock in readable:
+                        kind, ident, result = recv_message(worker.sock)
+                        worker.last_heard = now
+                        if kind == ERROR:
+                            raise RemoteError("on worker %s:%d\n%s" % (worker.address + (result,)))
+                        if kind == RESULT and ident in worker.outstanding:
+                            start, stop = worker.outstanding.pop(ident)
+                            values[start:stop] = result[:, 0]
+                    if worker.outstanding and now - worker.last_heard > self.timeout:
+                        raise ConnectionError("worker %s:%d timed out" % worker.address)
+                    if now - worker.last_ping >= self.heartbeat:
+                        worker.last_ping = now
+                        send_message(worker.sock, PING, 0)
+                except OSError:    # including ConnectionError and socket.timeout
+                    self.kill(worker, chunks)
+                    live.remove(worker)
@@ -0,0 +1,132 @@
+import heapq
+
+import numpy as np
+
+import _hilbert
+
+
+class HilbertIndex():
+    """Spatial index of points of the unit hyper-cube, kept sorted by the Hilbert keys of their cells on a
+    2^bits grid. Points are added in batches and merged into the sorted arrays at the next query.
+
+    The points of any cell of side 2^-l (a node at level l) are a contiguous run of the sorted keys, those
+    sharing the first l * ndim bits, so the curve is a 2^ndim-ary tree that is searched by bisection: the
+    runs of the occupied child cells are found by binary search, and runs of at most `leaf_size` points
+    are scanned. Box and ball queries visit the cells crossing their boundary, nearest neighbour queries
+    the cells in order of their distance to the query point, in about O(log n + k).
+    """
+    def __init__(self, ndim, bits=16, leaf_size=16):
+        self.ndim      = ndim
+        self.bits      = bits
+        self.leaf_size = leaf_size
+        words          = _hilbert.n_words(bits, ndim)
+        self.keys      = np.empty((0, words), dtype=np.uint64)    # sorted
+        self.sorted    = np.empty(0, dtype='S%d' % (8 * words))    # the keys as byte strings, to bisect
+        self.grid      = np.empty((0, ndim), dtype=np.int64)    # cell of each point on the 2^bits grid
+        self.points    = np.empty((0, ndim))
+        self.ids       = np.empty(0, dtype=np.int64)
+        self.added     = []    # (points, ids) batches not merged yet
+        self.n_added   = 0
+
+    def __len__(self):
+        return len(self.ids) + sum(len(ids) for _, ids in self.added)
+
+    def add(self, points, ids=None):
+        """Add `points` (unit coordinates, one per row) with their `ids`, by default the order they were added in."""
+        points = np.asarray(points, dtype=float).reshape(-1, self.ndim)
+        ids    = np.arange(self.n_added, self.n_added + len(points)) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.n_added += len(points)
+        if len(points):
+            self.added.append((points, ids))
+
+    def merge(self):
+        """Merge the points added since the last query into the sorted arrays."""
+        if not self.added:
+            return
+        points = np.concatenate([points for points, _ in self.added])
+        ids    = np.concatenate([ids for _, ids in self.added])
+        self.added = []
+        grid   = np.minimum((points * 2 ** self.bits).astype(np.int64), 2 ** self.bits - 1)
+        keys   = _hilbert.coordinates_to_keys(grid, self.bits, self.ndim)
+        order  = _hilbert.argsort_keys(keys)
+        keys   = keys[order]
+        new    = _hilbert.sortable(keys)
+        at     = np.searchsorted(self.sorted, new, side='right')
+        self.keys   = np.insert(self.keys, at, keys, axis=0)
+        self.sorted = np.insert(self.sorted, at, new)
+        self.grid   = np.insert(self.grid, at, grid[order], axis=0)
+        self.points = np.insert(self.points, at, points[order], axis=0)
+        self.ids    = np.insert(self.ids, at, ids[order])
+
+    def children(self, level, lo, hi):
+        """Yield the (level + 1, lo, hi) runs of the occupied child cells of the cell at `level` holding points lo:hi."""
+        shift = self.ndim * (self.bits - level - 1)
+        while lo < hi:
+            prefix = _hilbert.keys_to_ints(self.keys[lo:lo+1])[0] >> shift
+            end    = _hilbert.sortable(_hilbert.ints_to_keys([(prefix + 1) << shift], self.bits, self.ndim))
+            stop   = lo + int(np.searchsorted(self.sorted[lo:hi], end[0]))
+            yield level + 1, lo, stop
+            lo = stop
+
+    def cell(self, level, lo):
+        """Return the (lower, upper) corners of the cell at `level` holding point `lo`."""
+        corner = self.grid[lo] >> (self.bits - level)
+        return corner / 2 ** level, (corner + 1) / 2 ** level
+
+    def box(self, lower, upper):
+        """Return the ids of the points within the box [lower, upper] (unit coordinates), in curve order."""
+        return self.ids[self.within(lower, upper)]
+
+    def within(self, lower, upper):
+        """Return the positions in the sorted arrays of the points within the box [lower, upper]."""
+        self.merge()
+        lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+        found, nodes = [], [(0, 0, len(self.ids))] if len(self.ids) else []
+        while nodes:
+            level, lo, hi = nodes.pop()
+            cell_lower, cell_upper = self.cell(level, lo)
+            if (cell_lower > upper).any() or (cell_upper < lower).any():
+                continue
+            if (cell_lower >= lower).all() and (cell_upper <= upper).all():
+                found.append(np.arange(lo, hi))
+            elif hi - lo <= self.leaf_size or level == self.bits:
+                inside = ((self.points[lo:hi] >= lower) & (self.points[lo:hi] <= upper)).all(axis=1)
+                found.append(lo + np.flatnonzero(inside))
+            else:
+                nodes.extend(self.children(level, lo, hi))
+        return np.sort(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def ball(self, x, radius):
+        """Return the ids of the points within `radius` of `x` (unit coordinates) and their distances, nearest first."""
+        x     = np.asarray(x, dtype=float)
+        found = self.within(x - radius, x + radius)
+        d     = np.sqrt(((self.points[found] - x) ** 2).sum(axis=1))
+        order = np.argsort(d, kind='stable')
+        order = order[d[order] <= radius]
+        return self.ids[found[order]], d[order]
+
+    def nearest(self, x, k=1):
+        """Return the ids of the `k` points nearest `x` (unit coordinates) and their distances, nearest first.
+        Cells and points are visited best first, by their distance to `x`, so the search ends with the k-th point.
+        """
+        self.merge()
+        x     = np.asarray(x, dtype=float)
+        heap  = [(0., 0, 0, 0, len(self.ids))] if len(self.ids) else []    # (distance^2, tie, level, lo, hi)
+        tie   = 1
+        found = []
+        while heap and len(found) < k:
+            d2, _, level, lo, hi = heapq.heappop(heap)
+            if level < 0:    # a point
+                found.append((lo, d2))
+            elif hi - lo <= self.leaf_size or level == self.bits:
+                for i, d2 in zip(range(lo, hi), ((self.points[lo:hi] - x) ** 2).sum(axis=1).tolist()):
+                    heapq.heappush(heap, (d2, tie, -1, i, i + 1))
+                    tie += 1
+            else:
+                for child in self.children(level, lo, hi):
+                    cell_lower, cell_upper = self.cell(child[0], child[1])
+                    gap = np.maximum(np.maximum(cell_lower - x, x - cell_upper), 0.)
+                    heapq.heappush(heap, (float(gap @ gap), tie) + child)
+                    tie += 1
+        return (np.array([self.ids[i] for i, _ in found], dtype=np.int64),
+                np.sqrt(np.array([d2 for _, d2 in found], dtype=float)))
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class RBFSurrogate():
+    """Cubic radial basis function interpolant with a linear tail, of the real values of f at the rectangle
+    centers (unit coordinates). Points are added as they are evaluated: the matrix of basis values is grown
+    by their rows and columns, and the interpolation system solved again at the next prediction.
+
+    A new center is screened out, given its predicted value instead of being evaluated, if the prediction
+    exceeds the incumbent by more than `margin` times the spread of the values fitted (their median less
+    the incumbent), once `min_points` are fitted (by default 2 (D + 1)). Beyond `max_points` only the best
+    are fitted, so that poorly fitted regions are predicted too low rather than wrongly screened out.
+    """
+    def __init__(self, margin=1., min_points=None, max_points=500):
+        self.margin     = margin
+        self.min_points = min_points
+        self.max_points = max_points
+        self.points     = None          # (n, D) unit coordinates
+        self.values     = np.empty(0)
+        self.centers    = None          # points of the basis functions
+        self.phi        = None          # basis values between the centers, grown with them while all are fitted
+        self.coef       = None          # weights of the basis functions then of the linear tail; None if stale
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, points, values):
+        """Add the real values of f at `points` (unit coordinates) to the fit."""
+        points = np.asarray(points, dtype=float).reshape(len(values), -1)
+        self.points = points if self.points is None else np.concatenate((self.points, points))
+        self.values = np.concatenate((self.values, np.asarray(values, dtype=float)))
+        self.coef   = None
+
+    @staticmethod
+    def basis(a, b):
+        """Return the cubic basis values |a_i - b_j|^3. Each is summed over the coordinates in turn, so that
+        it does not depend on the other points, nor on the blocks the basis matrix is grown by.
+        """
+        d2 = np.zeros((len(a), len(b)))
+        for k in range(a.shape[1]):
+            d2 += (a[:, k, np.newaxis] - b[:, k]) ** 2
+        return d2 ** 1.5
+
+    def fit(self):
+        n = len(self.values)
+        if n > self.max_points:
+            keep = np.sort(np.argsort(self.values, kind='stable')[:self.max_points])
+            self.centers, values = self.points[keep], self.values[keep]
+            self.phi = self.basis(self.centers, self.centers)
+        else:
+            values, m = self.values, 0 if self.phi is None else len(self.phi)
+            if m < n:    # grow by the rows and columns of the points added since
+                phi = np.empty((n, n))
+                if m:
+                    phi[:m, :m] = self.phi
+                phi[:, m:] = self.basis(self.points, self.points[m:])
+                phi[m:, :m] = phi[:m, m:].T
+                self.phi = phi
+            self.centers = self.points
+        tail = np.hstack((np.ones((len(values), 1)), self.centers))
+        A    = np.block([[self.phi, tail], [tail.T, np.zeros((tail.shape[1], tail.shape[1]))]])
+        rhs  = np.concatenate((values, np.zeros(tail.shape[1])))
+        try:
+            self.coef = np.linalg.solve(A, rhs)
+        except np.linalg.LinAlgError:    # points on a hyperplane leave the tail undetermined
+            self.coef = np.linalg.lstsq(A, rhs, rcond=None)[0]
+
+    def predict(self, points):
+        """Return the predicted values of f at `points` (unit coordinates)."""
+        if self.coef is None:
+            self.fit()
+        points, n = np.asarray(points, dtype=float), len(self.centers)
+        return self.basis(points, self.centers) @ self.coef[:n] + self.coef[n] + points @ self.coef[n+1:]
+
+    def screen(self, points, f_best):
+        """Return the predictions at `points` (unit coordinates) far above `f_best`, NaN at those to evaluate."""
+        points   = np.asarray(points, dtype=float)
+        screened = np.full(len(points), np.nan)
+        spread   = np.median(self.values) - f_best if len(self.values) else 0.
+        if len(self.values) < (self.min_points or 2 * (points.shape[1] + 1)) or not spread > 0:
+            return screened
+        predicted = self.predict(points)
+        far = predicted - f_best > self.margin * spread
+        screened[far] = predicted[far]
+        return screened
@@ -0,0 +1,63 @@
+import csv
+import functools
+
+import numpy as np
+import pytest
+
+import batch
+from batch import estimate_cost, job, result_table, run_batch
+from direct import Direct, GlobalMin
+from helper import func3, func6, func7, func8
+
+
+def _jobs():
+    return [job('camel', func3, [[-3, 2]] * 2, GlobalMin(known=True, val=-1.031628453489877)),
+            job('hartmann', func6, [[0, 1]] * 3, max_feval=400, max_rectdiv=1000, max_iter=100),
+            job('branin-max', func7, [[-5, 10], [0, 15]], GlobalMin(minimize=False), max_iter=20),
+            job('shekel', functools.partial(func8, m=7), [[0, 10]] * 4, max_feval=300, max_iter=50)]
+
+
+def _single(job):
+    d = Direct(job.f, job.bounds, globalmin=job.globalmin, **job.params)
+    for _ in d.iterate():
+        pass
+    return d
+
+
+def test_batch_matches_single_runs():
+    """Assert each job run in the pool gives the search of the same Direct run on its own."""
+    jobs    = _jobs()
+    results = list(run_batch(jobs, processes=2))
+    assert sorted(result.job for result in results) == list(range(len(jobs)))
+    for result in results:
+        d = _single(jobs[result.job])
+        assert result.error is None and result.name == jobs[result.job].name
+        assert result.curr_opt == d.true_sign(d.curr_opt) and np.array_equal(result.x_at_opt, d.x_at_opt)
+        assert (result.n_feval, result.n_iter, result.n_rectdiv) == (d.n_feval, d.n_iter, d.n_rectdiv)
+
+
+def test_costliest_first():
+    jobs = _jobs() + [job('hartmann-6d', functools.partial(func6, nopt=6), [[0, 1]] * 6, cost=1e9)]
+    assert [estimate_cost(j) for j in jobs] == [400, 1200, 400, 800, 1e9]
+    order = [result.job for result in run_batch(jobs, processes=0)]
+    assert order == [4, 1, 3, 0, 2]    # ties keep the batch order
+
+
+def _failing(x):
+    raise ValueError("no value at %s" % x)
+
+
+def test_failed_job_and_table(tmp_path):
+    """Assert a failing job is reported in the table without stopping the others."""
+    jobs  = [_jobs()[0], job('failing', _failing, [[0, 1]] * 3), _jobs()[2]]
+    table = result_table(run_batch(jobs, processes=2))
+    assert table['job'].tolist() == [0, 1, 2] and table['name'].tolist() == ['camel', 'failing', 'branin-max']
+    assert table['ok'].tolist() == [True, False, True]
+    assert np.isnan(table['curr_opt'][1]) and table['curr_opt'][2] > 0    # maximization in true sign
+    assert table['x_at_opt'].shape == (3, 3) and np.isnan(table['x_at_opt'][[0, 2], 2]).all()
+    path = str(tmp_path / 'results.csv')
+    batch.write_csv(table, path)
+    with open(path) as file:
+        rows = list(csv.DictReader(file))
+    assert [row['name'] for row in rows] == ['camel', 'failing', 'branin-max']
+    assert float(rows[0]['x1']) == pytest.approx(table['x_at_opt'][0, 1])
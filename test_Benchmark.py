@@ -0,0 +1,100 @@
+import csv
+import json
+
+import pytest
+
+import benchmark
+from benchmark import CASES, FIELDS, compare, run_case, run_cases
+
+
+def _case(name):
+    return next(case for case in CASES if case.name == name)
+
+
+def test_run_case_reaches_optimum():
+    record = run_case(_case('branin'))
+    assert list(record) == FIELDS
+    assert record['reached'] and record['evals_to_tol'] == record['n_feval']
+    assert record['error'] < 1e-2 and record['peak_rects'] == record['n_feval'] - 1
+
+
+def test_run_case_budget():
+    """Assert a case whose optimum is not reached stops at the evaluation budget."""
+    record = run_case(_case('hartmann-3d'), max_feval=300)
+    assert not record['reached'] and record['evals_to_tol'] is None
+    assert record['n_feval'] == 300
+
+
+def test_run_case_exhausted_hilbert_curve():
+    """Assert a search that stops with every cell of a coarse Hilbert curve evaluated is not counted as reached."""
+    record = run_case(_case('branin'), mode='hilbert', bits=2)
+    assert not record['reached'] and record['evals_to_tol'] is None
+    assert record['n_feval'] == 9 and record['error'] > 1e-2
+
+
+def test_run_cases_isolated():
+    """Assert a case run in a fresh process gives the same search as in this one."""
+    isolated, = run_cases([_case('six-hump-camel')])
+    local, = run_cases([_case('six-hump-camel')], isolate=False)
+    for field in ('best', 'evals_to_tol', 'n_iter', 'peak_rects'):
+        assert isolated[field] == local[field]
+
+
+def test_compare_flags_regressions():
+    old = run_case(_case('shekel-5'))
+    same = dict(old)
+    slower = dict(old, wall_time=old['wall_time'] + 1.)
+    worse = dict(old, evals_to_tol=old['evals_to_tol'] + 1)
+    lost = dict(old, reached=False, evals_to_tol=None)
+    assert compare([same], [old]) == []
+    assert compare([slower], [old]) == [('shekel-5', 'wall_time', old['wall_time'], slower['wall_time'])]
+    assert [r[1] for r in compare([worse, lost], [old])] == ['evals_to_tol', 'reached']
+    assert compare([dict(old, case='other')], [old]) == []
+
+
+def test_output_files(tmp_path):
+    records = [run_case(_case('rastrigin')), run_case(_case('michalewicz-2d'))]
+    benchmark.write_json(records, str(tmp_path / 'results.json'), max_feval=20000)
+    assert benchmark.read_json(str(tmp_path / 'results.json')) == records
+    benchmark.write_csv(records, str(tmp_path / 'results.csv'))
+    with open(str(tmp_path / 'results.csv')) as file:
+        rows = list(csv.DictReader(file))
+    assert [row['case'] for row in rows] == ['rastrigin', 'michalewicz-2d']
+    assert float(rows[1]['best']) == pytest.approx(records[1]['best'])
+
+
+def test_main_exit_code(tmp_path):
+    """Assert main exits 1 when the baseline is better than the run."""
+    path = str(tmp_path / 'base.json')
+    assert benchmark.main(['--cases', 'branin', '--no-isolate', '--json', path]) == 0
+    assert benchmark.main(['--cases', 'branin', '--no-isolate', '--baseline', path]) == 0
+    base = benchmark.read_json(path)
+    base[0]['evals_to_tol'] -= 1
+    benchmark.write_json(base, path)
+    assert benchmark.main(['--cases', 'branin', '--no-isolate', '--baseline', path]) == 1
+
+
+def test_main_hilbert_mode(tmp_path):
+    """Assert --mode and --bits reach Direct, and are recorded with the results."""
+    path = str(tmp_path / 'hilbert.json')
+    assert benchmark.main(['--cases', 'branin', '--no-isolate', '--mode', 'hilbert', '--bits', '12',
+                           '--json', path]) == 0
+    with open(path) as file:
+        params = json.load(file)['params']
+    assert (params['mode'], params['bits']) == ('hilbert', 12)
+    assert benchmark.read_json(path)[0]['reached']
+
+def test_run_case_vectorized():
+    """Assert the batch versions of a case give the serial search."""
+    serial, vectorized = run_case(_case('shubert')), run_case(_case('shubert'), vectorized=True)
+    for field in ('evals_to_tol', 'n_iter', 'peak_rects'):
+        assert vectorized[field] == serial[field]
+    assert vectorized['best'] == pytest.approx(serial['best'], rel=1e-12)
+
+
+def test_locally_biased_selection_on_smooth_case():
+    """Assert DIRECT-L reaches the Rosenbrock optimum in fewer evaluations than the original rule."""
+    from direct import LocallyBiasedSelection
+    original = run_case(_case('rosenbrock'))
+    local = run_case(_case('rosenbrock'), selection=LocallyBiasedSelection())
+    assert local['reached'] and local['evals_to_tol'] < original['evals_to_tol']
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from cache import EvalCache
+from direct import Direct, GlobalMin
+from helper import func6
+
+bounds = np.array([[0., 1.]] * 3)
+
+
+class CountedFunc6():
+    def __init__(self):
+        self.n_calls = 0
+
+    def __call__(self, x):
+        self.n_calls += 1
+        return func6(x)
+
+
+def _result(d):
+    return d.n_feval, d.n_iter, d.curr_opt, tuple(d.x_at_opt)
+
+
+def test_rerun_replays_cached_prefix(tmp_path):
+    """Assert a rerun with a larger budget only calls f for the points beyond the first run."""
+    path = str(tmp_path / "func6.cache")
+    f = CountedFunc6()
+    first = Direct(f, bounds, max_iter=100, max_feval=150, cache=EvalCache(path=path))
+    first.run(None)
+    first.cache.close()
+    assert f.n_calls == first.n_feval
+
+    f.n_calls = 0
+    second = Direct(f, bounds, max_iter=100, max_feval=300, cache=EvalCache(path=path))
+    second.run(None)
+    second.cache.close()
+    reference = Direct(func6, bounds, max_iter=100, max_feval=300)
+    reference.run(None)
+    assert _result(second) == _result(reference)
+    assert second.n_cache_hits == first.n_feval
+    assert f.n_calls == second.n_feval - first.n_feval
+
+
+def test_lru_eviction():
+    """Assert the in-memory cache keeps only the most recently used entries."""
+    cache = EvalCache(maxsize=2)
+    cache.open(bounds)
+    a, b, c = (np.array([k, k, k]) for k in (1, 3, 5))
+    cache.put(a, 1.)
+    cache.put(b, 2.)
+    assert cache.get(a) == 1.
+    cache.put(c, 3.)
+    assert len(cache) == 2
+    assert cache.get(b) is None
+    assert cache.get(a) == 1. and cache.get(c) == 3.
+
+
+def test_file_checks_bounds_and_truncation(tmp_path):
+    """Assert a cache file is refused for other bounds and a torn last record is dropped."""
+    path = str(tmp_path / "f.cache")
+    cache = EvalCache(path=path)
+    cache.open(bounds)
+    cache.put(np.array([1, 2, 3]), 0.5)
+    cache.put(np.array([4, 5, 6]), 0.25)
+    cache.close()
+    with open(path, 'ab') as file:
+        file.write(b'\x01\x02\x03')
+    with pytest.raises(ValueError):
+        EvalCache(path=path).open(bounds * 2.)
+    cache = EvalCache(path=path)
+    cache.open(bounds)
+    assert len(cache) == 2 and cache.get(np.array([4, 5, 6])) == 0.25
+    cache.put(np.array([7, 8, 9]), 1.)
+    cache.close()
+    cache = EvalCache(path=path)
+    cache.open(bounds)
+    assert len(cache) == 3 and cache.get(np.array([7, 8, 9])) == 1.
+
+
+def test_maximization_and_vectorized_share_cache():
+    """Assert cached values keep the sign of f and serve vectorized runs."""
+    cache = EvalCache()
+    serial = Direct(func6, bounds, globalmin=GlobalMin(minimize=False), cache=cache)
+    serial.run(None)
+    batched = Direct(lambda x: func6(x.T), bounds, globalmin=GlobalMin(minimize=False), vectorized=True, cache=cache)
+    batched.run(None)
+    assert _result(batched) == _result(serial)
+    assert batched.n_cache_hits == batched.n_feval
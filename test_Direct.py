@@ -0,0 +1,702 @@
+import numpy as np
+import pytest
+
+import _hilbert
+import helper
+from direct import Direct, GlobalMin
+from helper import func3, func6
+
+bounds3 = np.array([[-3., 2.], [-3., 2.]])
+bounds6 = np.array([[0., 1.]] * 3)
+
+
+def _result(d):
+    return d.n_feval, d.n_iter, d.curr_opt, tuple(d.x_at_opt)
+
+
+def test_vectorized_matches_serial():
+    """Assert one batched call per iteration reproduces the point-by-point run exactly."""
+    n_calls = []
+    def batch_func6(x):
+        n_calls.append(len(x))
+        return func6(x.T)
+    serial = Direct(func6, bounds6, max_iter=20, max_feval=500)
+    serial.run(None)
+    batched = Direct(batch_func6, bounds6, max_iter=20, max_feval=500, vectorized=True)
+    batched.run(None)
+    assert _result(batched) == _result(serial)
+    assert len(n_calls) == batched.n_iter + 1
+    assert sum(n_calls) >= batched.n_feval
+
+
+def test_vectorized_known_optimum():
+    """Assert the tolerance test is applied to the batched values in evaluation order."""
+    globalmin = GlobalMin(known=True, val=-1.031628453489877)
+    serial = Direct(func3, bounds3, globalmin=globalmin)
+    serial.run(None)
+    batched = Direct(lambda x: func3(x.T), bounds3, globalmin=globalmin, vectorized=True)
+    batched.run(None)
+    assert _result(batched) == _result(serial)
+
+
+def test_executor_matches_serial():
+    """Assert evaluating each iteration in a process pool reproduces the serial run exactly."""
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    serial = Direct(func6, bounds6, max_iter=20, max_feval=300)
+    serial.run(None)
+    for pool in (ThreadPoolExecutor(4), ProcessPoolExecutor(2)):
+        with pool:
+            parallel = Direct(func6, bounds6, max_iter=20, max_feval=300, executor=pool)
+            parallel.run(None)
+        assert _result(parallel) == _result(serial)
+
+
+def test_executor_maximization():
+    """Assert the maximization wrapper can be shipped to worker processes."""
+    from concurrent.futures import ProcessPoolExecutor
+    globalmin = GlobalMin(minimize=False)
+    serial = Direct(func3, bounds3, globalmin=globalmin)
+    serial.run(None)
+    with ProcessPoolExecutor(2) as pool:
+        parallel = Direct(func3, bounds3, globalmin=globalmin, executor=pool)
+        parallel.run(None)
+    assert _result(parallel) == _result(serial)
+
+
+def test_arun_async_objective():
+    """Assert arun drives a coroutine objective to the known optimum with bounded concurrency."""
+    import asyncio
+    rng = np.random.default_rng(0)
+    in_flight = [0, 0]    # current, peak
+    async def afunc3(x):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(rng.uniform(0., 1e-3))
+        in_flight[0] -= 1
+        return func3(x)
+    d = Direct(afunc3, bounds3, globalmin=GlobalMin(known=True, val=-1.031628453489877))
+    pending = []    # n_pending after each selection
+    d.observers.append(lambda stats: pending.append(d.n_pending))
+    asyncio.run(d.arun(max_pending=4))
+    assert d.TERMINATE
+    assert 1 <= in_flight[1] <= 4
+    assert len(pending) > 1 and 0 < min(pending) and max(pending) <= 4 + 2 * 2    # one rectangle's children past max_pending at most
+    assert (d.curr_opt + 1.031628453489877) / 1.031628453489877 < d.tolerance
+    assert np.isclose(func3(d.x_at_opt), d.curr_opt)
+    assert d.n_pending == 0
+    assert len(d.rects) == sum(len(heap) for heap in d.rects.classes.values())
+
+
+def test_arun_budget():
+    """Assert arun stops on max_feval and keeps every rectangle in a size class, including interrupted ones."""
+    import asyncio
+    d = Direct(func6, bounds6, max_feval=100, max_iter=1000)
+    asyncio.run(d.arun(max_pending=6))
+    assert d.n_feval == 100 and d.stop_reason == 'max_feval'
+    assert len(d.rects) == sum(len(heap) for heap in d.rects.classes.values()) == 1 + 2 * d.n_rectdiv
+    assert d.rects.f_vals[:len(d.rects)].min() >= d.curr_opt
+    d = Direct(func6, bounds6, max_feval=1000)
+    asyncio.run(d.arun(max_pending=6))
+    assert d.n_iter == d.max_iter + 1 and d.stop_reason == 'max_iter' and not d.TERMINATE
+    d = Direct(func3, bounds3, mode='hilbert', bits=2, max_feval=1000, max_iter=1000)
+    asyncio.run(d.arun())
+    assert d.n_feval == 9 and d.stop_reason == 'max_level'
+
+
+def test_arun_convergence_criteria():
+    """Assert arun applies the convergence criteria per selection, and rejects the options it cannot honour."""
+    import asyncio
+    from direct import NelderMead
+    budget = dict(max_feval=20000, max_iter=10000, max_rectdiv=100000)
+    for criterion, reason in ((dict(stall_iter=10), 'stall'), (dict(d2_tol=1e-3), 'd2'),
+                              (dict(large_d2=0.01, volume_tol=0.7), 'volume')):
+        d = Direct(func6, bounds6, **criterion, **budget)
+        asyncio.run(d.arun(max_pending=6))
+        assert d.stop_reason == reason and d.n_feval < 2000 and d.n_pending == 0
+        assert len(d.rects) == sum(len(heap) for heap in d.rects.classes.values())
+    for option in (dict(local=NelderMead()), dict(prune=True)):
+        with pytest.raises(AssertionError):
+            asyncio.run(Direct(func6, bounds6, **option).arun())
+
+def test_rectangle_store():
+    """Assert the store tracks the best rectangle per size class as rectangles are divided."""
+    from direct import LATTICE
+    d = Direct(func6, bounds6, max_iter=30, max_feval=1000)
+    d.run(None)
+    n = len(d.rects)
+    assert n == 1 + 2 * d.n_rectdiv
+    assert np.isclose(d.rects.f_vals[:n].min(), d.curr_opt)
+    levels = d.rects.levels[:n].astype(int)
+    assert np.all(d.rects.size[:n] == levels.sum(axis=1))
+    assert np.all(levels.max(axis=1) - levels.min(axis=1) <= 1)
+    for key, heap in d.rects.classes.items():
+        members = np.nonzero(d.rects.size[:n] == key)[0]
+        assert sorted(i for _, i in heap) == members.tolist()
+        assert d.rects.f_vals[d.rects.best(key)] == d.rects.f_vals[members].min()
+        assert np.isclose(d.rects.d2(key), np.sum((3. ** -levels[members[0]] / 2.) ** 2))
+    # rectangles tile the unit cube exactly: centers are distinct odd lattice points inside it
+    centers, half = d.rects.centers[:n], LATTICE // 2 // 3 ** levels
+    assert np.all((centers - half >= 0) & (centers + half <= LATTICE))
+    assert np.all((centers // (LATTICE // 3 ** levels // 2)) % 2 == 1)
+    assert len(np.unique(centers, axis=0)) == n
+    assert np.isclose(np.sum(3. ** -levels.sum(axis=1)), 1.)
+
+
+def test_levels_deeper_than_float_resolution():
+    """Assert size classes stay exact where repeated float division by 3 would merge or split them."""
+    d = Direct(helper.func4, np.array([[-1., 1.]] * 2), epsilon=0., max_iter=10**6, max_feval=3000, max_rectdiv=10**6)
+    d.run(None)
+    from direct import MAX_LEVEL
+    n = len(d.rects)
+    assert d.rects.levels[:n].max() == MAX_LEVEL
+    assert all(key < MAX_LEVEL * 2 for key in d.rects.classes)
+    assert sum(len(heap) for heap in d.rects.classes.values()) < n
+
+def _reference_selection(d):
+    """The quadratic lbound/ubound selection rule, kept to check get_potentially_optimal_rects against."""
+    border = sorted((d.rects.d2(key), heap[0][0], key) for key, heap in d.rects.classes.items())
+    border = np.array(border)
+    lbound, ubound = np.zeros(len(border)), np.zeros(len(border))
+    for i in range(len(border)):
+        smaller = border[:,0] < border[i,0]
+        larger  = border[:,0] > border[i,0]
+        lbound[i] = max((border[i,1] - border[smaller,1])/(border[i,0] - border[smaller,0])) if smaller.any() else -1.976e14
+        ubound[i] = min((border[larger,1] - border[i,1])/(border[larger,0] - border[i,0])) if larger.any() else 1.976e14
+    po = []
+    for i in np.nonzero(lbound <= ubound)[0]:
+        if d.curr_opt:
+            cond = (d.curr_opt - border[i,1] + border[i,0]*ubound[i])/abs(d.curr_opt) >= d.epsilon
+        else:
+            cond = border[i,1] - border[i,0]*ubound[i] <= 0
+        if cond:
+            po.append(d.rects.best(int(border[i,2])))
+    return po
+
+
+@pytest.mark.parametrize("f, bounds", [
+    (helper.func1, [[-2, 2]] * 2),
+    (helper.func2, [[-5, 5], [-2, 8]]),
+    (helper.func3, [[-3, 2]] * 2),
+    (helper.func4, [[-1, 1]] * 2),
+    (helper.func5, [[-600, 600]] * 10),
+    (helper.func6, [[0, 1]] * 3),
+    (helper.func7, [[-5, 10], [0, 15]]),
+    (helper.func8, [[0, 10]] * 4),
+    (helper.func9, [[-10, 10]] * 2),
+    (helper.func10, [[0, np.pi]] * 5),
+    (helper.func11, [[-500, 500]] * 4),
+])
+def test_hull_selection_matches_reference(f, bounds):
+    """Assert the convex-hull scan selects the same rectangles as the quadratic rule on every iteration."""
+    class CheckedDirect(Direct):
+        def get_potentially_optimal_rects(self):
+            po = super().get_potentially_optimal_rects()
+            assert po == _reference_selection(self)
+            return po
+    d = CheckedDirect(f, np.array(bounds, dtype=float), max_iter=10**6, max_feval=1500, max_rectdiv=10**6)
+    d.run(None)
+    assert d.n_feval >= 1500
+
+
+def _state(d):
+    n = len(d.rects)
+    return (_result(d), d.n_rectdiv, d.rects.centers[:n].tolist(), d.rects.levels[:n].tolist(),
+            d.rects.f_vals[:n].tolist(), sorted((key, sorted(heap)) for key, heap in d.rects.classes.items()))
+
+
+def test_resume_finished_run_with_larger_budget(tmp_path):
+    """Assert continuing a finished run from its checkpoint matches one run with the larger budget."""
+    path = str(tmp_path / "direct.npz")
+    reference = Direct(func6, bounds6, max_iter=100, max_feval=401)
+    reference.run(None)
+    first = Direct(func6, bounds6, max_iter=100, max_feval=203, checkpoint=path)
+    first.run(None)
+    assert first.TERMINATE and first.partial    # stopped in the middle of a division
+    resumed = Direct.resume(path, func6)
+    assert resumed.TERMINATE
+    resumed = Direct.resume(path, func6, max_feval=401)
+    resumed.run(None)
+    assert _state(resumed) == _state(reference)
+
+
+def test_resume_after_crash(tmp_path):
+    """Assert a run killed part way continues bit-identically from its last automatic checkpoint."""
+    path = str(tmp_path / "direct.npz")
+    globalmin = GlobalMin(minimize=False)
+    reference = Direct(func3, bounds3, globalmin=globalmin, max_iter=100, max_feval=300, max_rectdiv=1000)
+    reference.run(None)
+    calls = []
+    def crashing_func3(x):
+        calls.append(x)
+        if len(calls) > 250:
+            raise KeyboardInterrupt
+        return func3(x)
+    with pytest.raises(KeyboardInterrupt):
+        Direct(crashing_func3, bounds3, globalmin=globalmin, max_iter=100, max_feval=300, max_rectdiv=1000,
+               checkpoint=path, checkpoint_every=40).run(None)
+    resumed = Direct.resume(path, func3)
+    assert 200 <= resumed.n_feval <= 250
+    resumed.run(None)
+    assert _state(resumed) == _state(reference)
+    assert resumed.globalmin.minimize is False
+    with pytest.raises(AssertionError):
+        Direct(func3, bounds3, checkpoint_every=40)
+
+
+@pytest.mark.parametrize("bits, ndim", [(5, 2), (5, 3), (7, 1), (22, 3)])
+def test_hilbert_cell_mapping(bits, ndim):
+    """Assert u2l and l2u are inverse on cell centers for odd bits*D and indices wider than 64 bits."""
+    d = Direct(func6, np.array([[0., 1.]] * ndim), bits=bits, mode='hilbert')
+    rng = np.random.default_rng(bits)
+    l = [int(k) for k in rng.integers(0, 2**62, size=40)]
+    l = [k * d.N // 2**62 for k in l]
+    u = d.l2u(l)
+    assert u.shape == (40, ndim) and np.all((u > 0.) & (u < 1.))
+    keys = d.u2l(u)
+    assert (_hilbert.keys_to_ints(keys) if bits * ndim > 64 else keys.tolist()) == l
+    assert np.array_equal(d.l2u(keys), u)
+    assert np.array_equal(d.l2u(l[7]), u[7]) and d.u2l(u[7]) == l[7]
+
+
+def test_hilbert_mode():
+    """Assert 1-D DIRECT along the Hilbert curve reaches the Six-hump Camelback optimum."""
+    globalmin = GlobalMin(known=True, val=-1.031628453489877)
+    d = Direct(func3, bounds3, globalmin=globalmin, bits=12, mode='hilbert', max_feval=2000)
+    d.run(None)
+    assert d.TERMINATE and d.n_feval < 2000
+    assert (d.curr_opt - globalmin.value) / abs(globalmin.value) < d.tolerance
+    assert len(d.rects.classes) and d.rects.D == 1
+    assert np.isclose(func3(d.x_at_opt), d.curr_opt)
+    batched = Direct(lambda x: func3(x.T), bounds3, globalmin=globalmin, bits=12, mode='hilbert',
+                     max_feval=2000, vectorized=True)
+    batched.run(None)
+    assert _result(batched) == _result(d)
+
+
+def test_hilbert_mode_wide_index():
+    """Assert Hilbert mode runs when bits*D exceeds 64."""
+    d = Direct(func6, bounds6, bits=25, mode='hilbert', max_iter=1000, max_feval=300, max_rectdiv=1000)
+    d.run(None)
+    assert d.n_feval == 300
+    assert np.all((d.x_at_opt > 0.) & (d.x_at_opt < 1.))
+
+
+@pytest.mark.parametrize('bits', [2, 3, 5])
+def test_hilbert_mode_evaluates_each_cell_once(bits):
+    """Assert intervals are not divided below a cell of the curve, so no point is evaluated twice, and the
+    search ends once every interval is at that level.
+    """
+    points = []
+
+    def recorded3(x):
+        points.append(tuple(x))
+        return func3(x)
+
+    d = Direct(recorded3, bounds3, bits=bits, mode='hilbert', max_iter=10**6, max_feval=1000, max_rectdiv=10**6)
+    snapshots = list(d.iterate())
+    assert len(set(points)) == len(points) == d.n_feval
+    assert d.rects.max_level == d.hilbert_level() and 3 ** d.rects.max_level <= d.N < 3 ** (d.rects.max_level + 1)
+    assert d.stop_reason == 'max_level' and d.n_feval == 3 ** d.rects.max_level < 1000
+    assert len(snapshots[-1].points) == 0
+
+def test_profile():
+    """Assert profiling leaves the search unchanged and accounts for every phase."""
+    plain = Direct(func6, bounds6, max_iter=30, max_feval=500)
+    plain.run(None)
+    profiled = Direct(func6, bounds6, max_iter=30, max_feval=500, profile=True)
+    profiled.run(None)
+    assert _result(profiled) == _result(plain)
+    counts = profiled.profiler.counts
+    assert counts['selection'] == counts['division'] == profiled.n_iter
+    assert counts['evaluation'] == profiled.n_feval
+    assert counts['insertion'] >= len(profiled.rects) + profiled.n_iter    # every new and every divided rectangle
+    assert all(t >= 0. for t in profiled.profiler.times.values())
+    assert [stats['iter'] for stats in profiled.profiler.iterations] == list(range(1, profiled.n_iter + 1))
+    assert plain.profiler is None and 'divide_rectangles' not in vars(plain)
+
+
+def test_profile_resumed(tmp_path):
+    """Assert a resumed search profiles only the iterations it runs, and records their stats."""
+    path = str(tmp_path / 'profiled.npz')
+    first = Direct(func6, bounds6, max_iter=10, max_feval=1000, checkpoint=path)
+    first.run(None)
+    resumed = Direct.resume(path, func6, max_iter=20, profile=True)
+    resumed.run(None)
+    counts = resumed.profiler.counts
+    assert resumed.n_iter > first.n_iter and counts['selection'] == counts['division'] == resumed.n_iter - first.n_iter
+    assert [stats['iter'] for stats in resumed.profiler.iterations] == list(range(first.n_iter + 1, resumed.n_iter + 1))
+
+
+def test_trace_and_observers():
+    """Assert run writes one JSON line per iteration to `file` and calls the observers with the same stats."""
+    import io, json
+    seen = []
+    d = Direct(func6, bounds6, max_iter=15, max_feval=1000)
+    d.observers.append(seen.append)
+    trace = io.StringIO()
+    d.run(trace)
+    lines = [json.loads(line) for line in trace.getvalue().splitlines()]
+    assert lines == seen and len(lines) == d.n_iter
+    last = lines[-1]
+    assert (last['n_feval'], last['n_rectdiv'], last['n_rects']) == (d.n_feval, d.n_rectdiv, len(d.rects))
+    assert last['curr_opt'] == d.curr_opt and last['x_at_opt'] == d.x_at_opt.tolist()
+    assert last['n_classes'] == len(d.rects.classes)
+    assert all(stats['n_po'] >= 1 for stats in lines)
+    assert d.observers == [seen.append]    # the trace is detached after run
+
+
+def test_iterate_snapshots():
+    """Assert iterate reproduces run and reports every evaluated point once, with its value."""
+    reference = Direct(func6, bounds6, max_iter=20, max_feval=400)
+    reference.run(None)
+    d = Direct(func6, bounds6, max_iter=20, max_feval=400)
+    snapshots = list(d.iterate())
+    assert _result(d) == _result(reference)
+    assert [s.n_iter for s in snapshots] == list(range(d.n_iter + 1))
+    points = np.concatenate([s.points for s in snapshots])
+    f_vals = np.concatenate([s.f_vals for s in snapshots])
+    assert len(points) == d.n_feval and len(np.unique(points, axis=0)) == d.n_feval
+    assert np.allclose([func6(x) for x in points], f_vals)
+    last = snapshots[-1]
+    assert (last.n_feval, last.n_iter, last.curr_opt, tuple(last.x_at_opt)) == _result(d)
+
+
+def test_iterate_stop_and_continue():
+    """Assert searches stopped early continue exactly, so they can be interleaved in one thread."""
+    reference = [Direct(f, b, max_iter=30, max_feval=500) for f, b in ((func6, bounds6), (func3, bounds3))]
+    for d in reference:
+        d.run(None)
+    searches = [Direct(f, b, max_iter=30, max_feval=500) for f, b in ((func6, bounds6), (func3, bounds3))]
+    active = list(searches)
+    while active:    # round robin, two iterations at a time, through a fresh generator each turn
+        for d in list(active):
+            steps = d.iterate()
+            for _ in range(2):
+                if next(steps, None) is None:
+                    active.remove(d)
+                    break
+            steps.close()
+    assert [_result(d) for d in searches] == [_result(d) for d in reference]
+
+
+def test_iterate_maximization_signs():
+    globalmin = GlobalMin(minimize=False)
+    d = Direct(func3, bounds3, globalmin=globalmin)
+    snapshots = list(d.iterate())
+    f_vals = np.concatenate([s.f_vals for s in snapshots])
+    assert snapshots[-1].curr_opt == f_vals.max() == -d.curr_opt
+
+
+def test_locally_biased_selection():
+    """Assert DIRECT-L selects the best rectangle of distinct longest-side groups, among those on the hull."""
+    from direct import LocallyBiasedSelection
+    selections = []
+    class CheckedSelection(LocallyBiasedSelection):
+        def select(self, direct):
+            po = super().select(direct)
+            groups = [int(direct.rects.levels[i].min()) for i in po]
+            assert len(set(groups)) == len(groups)
+            for i, group in zip(po, groups):
+                members = [heap[0][0] for key, heap in direct.rects.classes.items() if key // direct.rects.D == group]
+                assert direct.rects.f_vals[i] == min(members)
+            selections.append(len(po))
+            return po
+    d = Direct(helper.func2, np.array([[-5., 5.], [-2., 8.]]), max_iter=10**6, max_feval=1000,
+               max_rectdiv=10**6, selection=CheckedSelection())
+    d.run(None)
+    assert len(selections) == d.n_iter and d.n_feval >= 1000
+
+
+def test_one_longest_side_division():
+    """Assert dividing one longest side at a time keeps the rectangles a tiling with levels one apart."""
+    from direct import LATTICE, OneLongestSide
+    d = Direct(func6, bounds6, max_iter=40, max_feval=600, division=OneLongestSide())
+    d.run(None)
+    n = len(d.rects)
+    assert n == 1 + 2 * d.n_rectdiv and d.n_feval == n + len(d.partial)
+    levels = d.rects.levels[:n].astype(int)
+    assert np.all(levels.max(axis=1) - levels.min(axis=1) <= 1)
+    assert np.isclose(np.sum(3. ** -levels.sum(axis=1)), 1.)
+    assert len(np.unique(d.rects.centers[:n], axis=0)) == n
+
+
+def test_custom_selection():
+    """Assert any object with select(direct) can drive the search: here only the incumbent's rectangle."""
+    class Greedy():
+        def select(self, direct):
+            n = len(direct.rects)
+            return [int(np.argmin(direct.rects.f_vals[:n]))]
+    d = Direct(func3, bounds3, max_iter=30, max_feval=10**6, selection=Greedy())
+    d.run(None)
+    assert d.n_iter == 31 and d.n_rectdiv >= 31
+
+
+def _drive(search, f):
+    """Run a local search generator on f to completion, returning its best point and value."""
+    best = (np.inf, None)
+    try:
+        x = next(search)
+        while True:
+            f_val = f(x)
+            best = min(best, (f_val, tuple(x)))
+            x = search.send(f_val)
+    except StopIteration:
+        return best
+
+
+@pytest.mark.parametrize("local", ["NelderMead", "PatternSearch"])
+def test_local_search_in_box(local):
+    """Assert the local searches converge on a quadratic, to the box boundary when its minimum lies outside."""
+    import direct
+    f = lambda x: float(np.sum((x - np.array([0.3, 0.6])) ** 2))
+    lower, upper = np.zeros(2), np.ones(2)
+    x0 = np.array([0.9, 0.1])
+    f_val, x = _drive(getattr(direct, local)().search(x0, f(x0), lower, upper), f)
+    assert np.allclose(x, [0.3, 0.6], atol=1e-6)
+    f_val, x = _drive(getattr(direct, local)().search(x0, f(x0), lower, np.array([0.2, 1.])), f)
+    assert np.allclose(x, [0.2, 0.6], atol=1e-6)
+
+
+def test_hybrid_reaches_tolerance_with_fewer_evaluations():
+    from direct import NelderMead
+    globalmin = GlobalMin(known=True, val=-1.031628453489877)
+    plain = Direct(func3, bounds3, globalmin=globalmin, tol=1e-4)
+    plain.run(None)
+    hybrid = Direct(func3, bounds3, globalmin=globalmin, tol=1e-4, local=NelderMead())
+    hybrid.run(None)
+    assert hybrid.TERMINATE and (hybrid.curr_opt - globalmin.value) / abs(globalmin.value) < 1e-4
+    assert 2 * hybrid.n_feval < plain.n_feval
+    assert np.isclose(func3(hybrid.x_at_opt), hybrid.curr_opt)
+
+
+def test_hybrid_budget_and_snapshots():
+    """Assert local evaluations count against max_feval and are reported in the snapshots, inside the bounds."""
+    from direct import PatternSearch
+    d = Direct(func6, bounds6, max_iter=10**6, max_feval=400, max_rectdiv=10**6, local=PatternSearch())
+    snapshots = list(d.iterate())
+    assert d.n_feval == 400
+    points = np.concatenate([s.points for s in snapshots])
+    f_vals = np.concatenate([s.f_vals for s in snapshots])
+    assert len(points) == 400 and len(points) > len(d.rects)
+    assert np.all((points >= 0.) & (points <= 1.))
+    assert np.allclose([func6(x) for x in points], f_vals)
+    assert f_vals.min() == d.curr_opt < d.rects.f_vals[:len(d.rects)].min()
+
+
+def test_resume_hybrid_run(tmp_path):
+    """Assert a resumed hybrid run only searches locally where the uninterrupted one does, and ends the same."""
+    from direct import NelderMead
+    path = str(tmp_path / "direct.npz")
+    reference = Direct(func6, bounds6, max_iter=1000, max_feval=601, max_rectdiv=10000, local=NelderMead())
+    reference.run(None)
+    first = Direct(func6, bounds6, max_iter=1000, max_feval=303, max_rectdiv=10000, local=NelderMead(),
+                   checkpoint=path)
+    first.run(None)
+    resumed = Direct.resume(path, func6, max_feval=601, local=NelderMead())
+    assert resumed.local_opt == first.local_opt < np.inf
+    resumed.run(None)
+    assert _state(resumed) == _state(reference)
+
+def test_hybrid_rejects_hilbert_mode():
+    from direct import NelderMead
+    with pytest.raises(AssertionError):
+        Direct(func6, bounds6, mode='hilbert', local=NelderMead())
+
+
+def test_prune_keeps_search():
+    """Assert dropping the rectangles the remaining budget cannot reach leaves the search unchanged."""
+    reference = Direct(func6, bounds6, max_iter=1000, max_feval=3000, max_rectdiv=10000)
+    reference.run(None)
+    pruned = Direct(func6, bounds6, max_iter=1000, max_feval=3000, max_rectdiv=10000, prune=True)
+    pruned.run(None)
+    assert _result(pruned) == _result(reference)
+    assert pruned.rects.n_pruned > 0
+    assert pruned.rects.n_entries == sum(len(heap) for heap in pruned.rects.classes.values())
+    assert pruned.rects.n_entries + pruned.rects.n_pruned == reference.rects.n_entries
+
+
+def test_spill_keeps_search(tmp_path):
+    """Assert spilling cold size classes to disk bounds the entries in memory and leaves the search unchanged."""
+    from direct import SpilledClass
+    reference = Direct(func6, bounds6, max_iter=1000, max_feval=3000, max_rectdiv=10000)
+    reference.run(None)
+    for prune in (False, True):
+        spilled = Direct(func6, bounds6, max_iter=1000, max_feval=3000, max_rectdiv=10000, prune=prune,
+                         spill=str(tmp_path / str(prune)), max_entries=100)
+        spilled.run(None)
+        assert _result(spilled) == _result(reference)
+        assert isinstance(spilled.rects.centers, np.ndarray) and (tmp_path / (str(prune) + '.centers')).exists()
+        assert any(isinstance(heap, SpilledClass) for heap in spilled.rects.classes.values())
+        in_memory = sum(len(heap.extra) if isinstance(heap, SpilledClass) else len(heap)
+                        for heap in spilled.rects.classes.values())
+        assert in_memory == spilled.rects.n_entries
+        for key, heap in spilled.rects.classes.items():
+            assert heap[0] == min(heap) and list(heap) == sorted(heap)
+        if not prune:
+            assert {key: sorted(heap) for key, heap in spilled.rects.classes.items()} == \
+                   {key: sorted(heap) for key, heap in reference.rects.classes.items()}
+
+
+def test_resume_spilled_run(tmp_path):
+    """Assert a memory-bounded run resumes from its checkpoint like an unbounded one."""
+    path = str(tmp_path / "direct.npz")
+    reference = Direct(func6, bounds6, max_iter=100, max_feval=801)
+    reference.run(None)
+    Direct(func6, bounds6, max_iter=100, max_feval=403, checkpoint=path, prune=True,
+           spill=str(tmp_path / "rects"), max_entries=50).run(None)
+    resumed = Direct.resume(path, func6, max_feval=801, prune=True, spill=str(tmp_path / "rects2"), max_entries=50)
+    resumed.run(None)
+    assert _state(resumed) == _state(reference)
+
+
+def _coarse6(x):
+    return func6(np.round(np.asarray(x) * 8) / 8) + 0.5    # biased, so a coarse optimum would look better
+
+
+def test_single_fidelity_matches_plain_f():
+    from direct import Fidelity
+    plain = Direct(func6, bounds6, max_iter=20, max_feval=300, max_rectdiv=1000)
+    plain.run(None)
+    fidelity = Direct([Fidelity(func6, 2.)], bounds6, max_iter=20, max_rectdiv=1000, max_cost=600)
+    fidelity.run(None)
+    assert _result(fidelity) == _result(plain)
+    assert fidelity.cost == 2 * fidelity.n_real == 2 * fidelity.n_feval
+
+
+def test_multi_fidelity():
+    """Assert large rectangles are scored at the coarse fidelity, the others and the optimum at the fine one,
+    and the run stops on its cost budget.
+    """
+    from direct import Fidelity
+    fidelities = [Fidelity(lambda x: _coarse6(x) - 1., 1., 0.01), Fidelity(func6, 10.)]
+    d = Direct(fidelities, bounds6, max_iter=1000, max_rectdiv=10000, max_cost=3000)
+    d.run(None)
+    assert d.TERMINATE and 3000 <= d.cost < 3010
+    assert d.cost == d.n_evals[0] + 10 * d.n_evals[1] and d.n_real == sum(d.n_evals)
+    assert d.n_evals[0] > 0 and d.low
+    assert d.curr_opt == func6(d.x_at_opt) < -2.5
+    for i in range(len(d.rects)):
+        f = _coarse6 if i in d.low else func6
+        assert d.rects.f_vals[i] == f(d.g2r(d.rects.centers[i])) - (1. if i in d.low else 0.)
+    snapshots_f = Direct(fidelities, bounds6, max_iter=1000, max_rectdiv=10000, max_cost=300)
+    for snapshot in snapshots_f.iterate():
+        assert np.array_equal(snapshot.f_vals, [func6(point) for point in snapshot.points])
+
+
+def test_multi_fidelity_known_optimum_and_resume(tmp_path):
+    """Assert the known optimum is only reached at the fine fidelity, and a checkpoint resumes exactly."""
+    from direct import Fidelity
+    fidelities = [Fidelity(_coarse6, 1., 0.02), Fidelity(func6, 5.)]
+    globalmin  = GlobalMin(known=True, val=-2.8)
+    d = Direct(fidelities, bounds6, globalmin=globalmin)
+    d.run(None)
+    assert d.TERMINATE and d.curr_opt < -2.8 * (1 - 1e-2) and d.curr_opt == func6(d.x_at_opt)
+    path = str(tmp_path / "direct.npz")
+    reference = Direct(fidelities, bounds6, max_iter=1000, max_rectdiv=10000, max_cost=2001)
+    reference.run(None)
+    first = Direct(fidelities, bounds6, max_iter=1000, max_rectdiv=10000, max_cost=1001, checkpoint=path)
+    first.run(None)
+    resumed = Direct.resume(path, fidelities, max_cost=2001)
+    assert (resumed.low, resumed.cost, resumed.n_evals) == (first.low, first.cost, first.n_evals)
+    resumed.run(None)
+    assert _state(resumed) == _state(reference) and resumed.cost == reference.cost
+
+
+def test_deadline_stops_in_time():
+    """Assert a run on a slow objective ends by its deadline with the best value evaluated, and none left pending."""
+    import time
+
+    def slow6(x):
+        time.sleep(0.002)
+        return func6(x)
+
+    d = Direct(slow6, bounds6, max_feval=100000, max_iter=1000, max_rectdiv=100000, deadline=0.4)
+    start = time.monotonic()
+    f_vals = np.concatenate([snapshot.f_vals for snapshot in d.iterate()])
+    assert time.monotonic() - start < 0.4 + 0.1
+    assert d.TERMINATE and 10 < d.n_feval < 100000 and d.eval_time > 0.002
+    assert d.curr_opt == f_vals.min() == func6(d.x_at_opt)
+
+
+def test_deadline_divides_what_fits():
+    """Assert an iteration only divides the best rectangles that fit in the time left, and none past it."""
+    import time
+    d = Direct(func6, bounds6, max_iter=5, deadline=1000.)
+    for _ in d.iterate():
+        pass
+    po_rects = d.get_potentially_optimal_rects()
+    n_evals  = {i: 2 * len(d.division.sides(d.rects.levels[i])) for i in po_rects}
+    best     = min(po_rects, key=lambda i: d.rects.f_vals[i])
+    assert len(po_rects) > 1 and d.affordable(po_rects) == po_rects
+    d.eval_time = 1.
+    d.end_time  = time.monotonic() + n_evals[best] + 0.5
+    assert d.affordable(po_rects) == [best]
+    d.end_time  = time.monotonic() - 1.
+    assert d.affordable(po_rects) == []
+    d.max_iter, d.TERMINATE = 100, False
+    n_feval = d.n_feval
+    for _ in d.iterate():
+        pass
+    assert d.TERMINATE and d.n_feval == n_feval
+
+
+def test_stop_reasons():
+    d = Direct(func6, bounds6, max_iter=100)
+    d.run(None)
+    assert d.stop_reason == 'max_feval' and d.n_feval == 200
+    d = Direct(func6, bounds6, max_feval=10000, max_iter=3)
+    d.run(None)
+    assert d.stop_reason == 'max_iter' and not d.TERMINATE
+    d = Direct(func6, bounds6, max_feval=10000, max_iter=100, max_rectdiv=50)
+    d.run(None)
+    assert d.stop_reason == 'max_rectdiv'
+    d = Direct(func3, bounds3, globalmin=GlobalMin(known=True, val=-1.031628453489877))
+    d.run(None)
+    assert d.stop_reason == 'optimum'
+
+
+def test_convergence_criteria():
+    """Assert each criterion ends a run of unknown optimum long before its budget, once it holds."""
+    budget = dict(max_feval=20000, max_iter=10000, max_rectdiv=100000)
+    d = Direct(func6, bounds6, stall_iter=10, **budget)
+    opts = [snapshot.curr_opt for snapshot in d.iterate()]
+    assert d.stop_reason == 'stall' and d.n_feval < 1000
+    assert len(set(opts[-11:])) == 1 and opts[-12] > opts[-1]
+    d = Direct(func6, bounds6, d2_tol=1e-4, **budget)
+    n_feval = [snapshot.n_feval for snapshot in d.iterate()]
+    assert d.stop_reason == 'd2' and d.n_feval < 1000 and n_feval[-1] == n_feval[-2]    # the last one not divided
+    assert d.rects.d2(d.rects.size[d.get_potentially_optimal_rects()]).min() < 1e-4
+    d = Direct(func6, bounds6, large_d2=0.01, volume_tol=0.05, **budget)
+    d.run(None)
+    assert d.stop_reason == 'volume' and d.n_feval < 5000 and d.large_volume() < 0.05
+    d = Direct(func6, bounds6, globalmin=GlobalMin(known=True, val=-2.8), stall_iter=1, d2_tol=1.)
+    d.run(None)
+    assert d.stop_reason == 'optimum'    # the criteria are for problems of unknown optimum
+
+
+def test_volume_criterion_with_prune():
+    """Assert the volume left in large rectangles counts those pruned from their size classes."""
+    runs = []
+    for prune in (False, True):
+        d = Direct(func6, bounds6, max_feval=3000, max_iter=100, max_rectdiv=100000, large_d2=0.003,
+                   volume_tol=0.5, prune=prune)
+        d.run(None)
+        runs.append(d)
+    plain, pruned = runs
+    assert pruned.rects.n_pruned and pruned.stop_reason == plain.stop_reason == 'max_iter'
+    assert pruned.n_feval == plain.n_feval and pruned.large_volume() == plain.large_volume() > 0.5
+    levels = pruned.rects.levels[:len(pruned.rects)].astype(float)
+    large  = pruned.rects.d2(levels.sum(axis=1).astype(int)) > 0.003
+    assert np.isclose(pruned.large_volume(), (3. ** -levels[large]).prod(axis=1).sum())
+
+def test_resume_stalled_run(tmp_path):
+    path = str(tmp_path / "direct.npz")
+    budget = dict(max_feval=20000, max_rectdiv=100000)
+    reference = Direct(func6, bounds6, max_iter=10000, stall_iter=10, **budget)
+    reference.run(None)
+    first = Direct(func6, bounds6, max_iter=reference.n_iter - 3, stall_iter=10, checkpoint=path, **budget)
+    first.run(None)
+    resumed = Direct.resume(path, func6, max_iter=10000, stall_iter=10)
+    assert (resumed.stall_since, resumed.stall_opt) == (first.stall_since, first.stall_opt)
+    resumed.run(None)
+    assert resumed.stop_reason == 'stall' and _state(resumed) == _state(reference)
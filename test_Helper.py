@@ -0,0 +1,50 @@
+import functools
+
+import numpy as np
+import pytest
+
+import helper
+
+# (scalar function, batch function, bounds)
+CASES = [
+    (helper.func1, helper.func1_batch, [[-2, 2]] * 2),
+    (helper.func2, helper.func2_batch, [[-5, 5], [-2, 8]]),
+    (helper.func3, helper.func3_batch, [[-3, 2]] * 2),
+    (helper.func4, helper.func4_batch, [[-1, 1]] * 2),
+    (functools.partial(helper.func5, nopt=2), functools.partial(helper.func5_batch, nopt=2), [[-600, 600]] * 2),
+    (helper.func5, helper.func5_batch, [[-600, 600]] * 10),
+    (helper.func6, helper.func6_batch, [[0, 1]] * 3),
+    (functools.partial(helper.func6, nopt=6), functools.partial(helper.func6_batch, nopt=6), [[0, 1]] * 6),
+    (helper.func7, helper.func7_batch, [[-5, 10], [0, 15]]),
+    (helper.func8, helper.func8_batch, [[0, 10]] * 4),
+    (functools.partial(helper.func8, m=10), functools.partial(helper.func8_batch, m=10), [[0, 10]] * 4),
+    (helper.func9, helper.func9_batch, [[-10, 10]] * 2),
+    (functools.partial(helper.func10, nopt=2), functools.partial(helper.func10_batch, nopt=2), [[0, np.pi]] * 2),
+    (helper.func10, helper.func10_batch, [[0, np.pi]] * 5),
+    (helper.func11, helper.func11_batch, [[-500, 500]] * 4),
+]
+
+
+@pytest.mark.parametrize("f, f_batch, bounds", CASES)
+def test_batch_matches_scalar(f, f_batch, bounds):
+    bounds = np.array(bounds, dtype=float)
+    X = np.random.default_rng(len(bounds)).uniform(bounds[:, 0], bounds[:, 1], size=(100, len(bounds)))
+    values = f_batch(X)
+    assert values.shape == (100,)
+    np.testing.assert_allclose(values, [f(x) for x in X], rtol=1e-12, atol=1e-12)
+    assert f_batch(X[:0]).shape == (0,)
+
+
+@pytest.mark.parametrize("call", [
+    lambda: helper.func1_batch(np.zeros(2)),               # a point, not a batch
+    lambda: helper.func3_batch(np.zeros((5, 3))),
+    lambda: helper.func5_batch(np.zeros((5, 2))),          # nopt=10
+    lambda: helper.func6_batch(np.zeros((5, 4)), nopt=4),
+    lambda: helper.func6_batch(np.zeros((5, 3)), nopt=6),
+    lambda: helper.func8_batch(np.zeros((5, 4)), m=11),
+    lambda: helper.func10_batch(np.zeros((5, 10))),        # nopt=5
+    lambda: helper.func11_batch(np.zeros((5, 2))),         # nopt=4
+])
+def test_batch_rejects_mismatched_dimension(call):
+    with pytest.raises(ValueError):
+        call()
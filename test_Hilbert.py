@@ -1,3 +1,6 @@
+import numpy as np
+import pytest
+
 import src._hilbert as hilbert
 
 bits = 5
@@ -35,4 +38,62 @@ def test_reversibility():
     for l in range(n_h):
         x = hilbert.distance_to_coordinates(l, bits, ndim)
         l_test = hilbert.coordinates_to_distance(x, bits, ndim)
-        assert l == l_test
\ No newline at end of file
+        assert l == l_test
+
+def test_batch_transpose():
+    """Assert the array transpose agrees with the string-based one on the docstring example."""
+    x = hilbert._hilbert_integers_to_transpose(np.array([10590], dtype=np.uint64), bits, ndim)
+    assert x.T.tolist() == [[13, 19, 6]]
+    assert hilbert._transpose_to_hilbert_integers(x, bits, ndim).tolist() == [[10590]]
+
+
+def test_batch_reversibility():
+    """Assert the batch transforms are inverse operations and agree with the scalar ones on every point."""
+    l = np.arange(2**(ndim * bits), dtype=np.uint64)
+    x = hilbert.distances_to_coordinates(l, bits, ndim)
+    assert np.array_equal(hilbert.coordinates_to_distances(x, bits, ndim), l)
+    for k in range(0, len(l), 97):
+        assert x[k].tolist() == hilbert.distance_to_coordinates(k, bits, ndim)
+
+
+@pytest.mark.parametrize("bits_, ndim_", [(1, 1), (7, 1), (3, 5), (16, 4), (21, 3), (8, 8)])
+def test_batch_matches_scalar(bits_, ndim_):
+    """Assert the batch transforms agree with the scalar ones up to 64-bit distances."""
+    rng = np.random.default_rng(bits_ * ndim_)
+    l = rng.integers(0, 2**(bits_ * ndim_), size=200, dtype=np.uint64, endpoint=False)
+    x = hilbert.distances_to_coordinates(l, bits_, ndim_)
+    assert x.tolist() == [hilbert.distance_to_coordinates(int(k), bits_, ndim_) for k in l]
+    assert np.array_equal(hilbert.coordinates_to_distances(x, bits_, ndim_), l)
+    assert x.max() < 2**bits_
+
+
+def test_batch_rejects_wide_distances():
+    with pytest.raises(ValueError):
+        hilbert.distances_to_coordinates(np.zeros(1, dtype=np.uint64), 13, 5)
+
+
+@pytest.mark.parametrize("bits_, ndim_", [(16, 10), (7, 13), (64, 2), (1, 130)])
+def test_keys_match_scalar(bits_, ndim_):
+    """Assert the multi-word transforms agree with the scalar ones beyond 64-bit distances."""
+    rng = np.random.default_rng(bits_ * ndim_)
+    l = [int.from_bytes(rng.bytes(bits_ * ndim_ // 8 + 1), 'big') % 2**(bits_ * ndim_) for _ in range(50)]
+    keys = hilbert.ints_to_keys(l, bits_, ndim_)
+    assert keys.shape == (50, hilbert.n_words(bits_, ndim_))
+    assert hilbert.keys_to_ints(keys) == l
+    x = hilbert.keys_to_coordinates(keys, bits_, ndim_)
+    assert x.tolist() == [hilbert.distance_to_coordinates(k, bits_, ndim_) for k in l]
+    assert np.array_equal(hilbert.coordinates_to_keys(x, bits_, ndim_), keys)
+
+
+def test_keys_order():
+    """Assert sorting, bisecting and comparing keys follow the order of the distances, including zero low words."""
+    l = [2**64, 2**64 + 1, 5, 2**127, 0, 2**64, 2**100 + 2**64]
+    keys = hilbert.ints_to_keys(l, 32, 4)
+    order = hilbert.argsort_keys(keys)
+    assert [l[i] for i in order] == sorted(l)
+    assert order.tolist()[:4] == [4, 2, 0, 5]    # stable
+    ordered = keys[order]
+    probe = hilbert.ints_to_keys([2**64, 2**64 + 2, 2**128 - 1], 32, 4)
+    assert hilbert.searchsorted_keys(ordered, probe).tolist() == [2, 5, 7]
+    assert hilbert.searchsorted_keys(ordered, probe, side='right').tolist() == [4, 5, 7]
+    assert hilbert.compare_keys(keys[:-1], keys[1:]).tolist() == [-1, 1, -1, 1, -1, -1]
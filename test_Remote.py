@@ -0,0 +1,106 @@
+import functools
+import os
+import signal
+
+import numpy as np
+import pytest
+
+from direct import Direct, GlobalMin
+from helper import func3, func6, func6_batch
+from remote import RemoteError, RemoteEvaluator, spawn_workers
+
+bounds3 = np.array([[-3., 2.], [-3., 2.]])
+bounds6 = np.array([[0., 1.]] * 3)
+
+
+def _result(d):
+    return d.n_feval, d.n_iter, d.curr_opt, tuple(d.x_at_opt)
+
+
+@pytest.fixture
+def workers():
+    started = []
+    def spawn(f, n, **kwargs):
+        processes, addresses = spawn_workers(f, n, **kwargs)
+        started.extend(processes)
+        return processes, addresses
+    yield spawn
+    for process in started:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGCONT)
+            process.terminate()
+        process.join()
+
+
+def _dying(x):
+    os._exit(1)
+
+
+def _failing(x):
+    raise ValueError("no value")
+
+
+def test_remote_matches_serial(workers):
+    """Assert a search evaluated on several workers is the serial search, maximizing too."""
+    _, addresses = workers(func6, 3)
+    _, addresses3 = workers(func3, 2)
+    serial = Direct(func6, bounds6, max_iter=20, max_feval=500)
+    serial.run(None)
+    with RemoteEvaluator(addresses, batch_size=4) as f:
+        remote = Direct(f, bounds6, max_iter=20, max_feval=500, vectorized=True)
+        remote.run(None)
+        assert _result(remote) == _result(serial) and f.n_resubmitted == 0
+    with RemoteEvaluator(addresses3, batch_size=4) as f:
+        globalmin = GlobalMin(minimize=False)
+        serial = Direct(func3, bounds3, globalmin=globalmin, max_iter=20, max_feval=300)
+        serial.run(None)
+        remote = Direct(f, bounds3, globalmin=globalmin, max_iter=20, max_feval=300, vectorized=True)
+        remote.run(None)
+        assert _result(remote) == _result(serial)
+
+
+def test_remote_vectorized_worker(workers):
+    """Assert points reach a worker as sent, one at a time or as a batch."""
+    _, addresses = workers(functools.partial(func6, nopt=3), 2)
+    _, batch_addresses = workers(func6_batch, 1, vectorized=True)
+    points = np.random.RandomState(0).rand(50, 3)
+    with RemoteEvaluator(addresses, batch_size=7) as f, RemoteEvaluator(batch_addresses, batch_size=7) as g:
+        assert np.array_equal(f(points), [func6(point) for point in points])
+        assert np.array_equal(g(points), np.concatenate([func6_batch(points[k:k + 7]) for k in range(0, 50, 7)]))
+
+
+def test_dead_worker_resubmitted(workers):
+    """Assert the chunks of a worker that exits are evaluated by the others."""
+    _, addresses = workers(func6, 2)
+    _, dying = workers(_dying, 1)
+    serial = Direct(func6, bounds6, max_iter=20, max_feval=500)
+    serial.run(None)
+    with RemoteEvaluator(dying + addresses, batch_size=4) as f:
+        remote = Direct(f, bounds6, max_iter=20, max_feval=500, vectorized=True)
+        remote.run(None)
+        assert _result(remote) == _result(serial)
+        assert f.n_resubmitted >= 1 and f.workers[0].sock is None
+
+
+def test_unresponsive_worker_times_out(workers):
+    """Assert a worker missing its heartbeats is given up and its chunks resubmitted."""
+    (stopped, _), addresses = workers(func6, 2)
+    os.kill(stopped.pid, signal.SIGSTOP)
+    points = np.random.RandomState(1).rand(40, 3)
+    with RemoteEvaluator(addresses, batch_size=5, heartbeat=0.05, timeout=0.5) as f:
+        assert np.array_equal(f(points), [func6(point) for point in points])
+        assert f.n_resubmitted >= 1 and f.workers[0].sock is None
+
+
+def test_remote_errors(workers):
+    _, failing = workers(_failing, 1)
+    _, addresses = workers(func6, 1)
+    points = np.random.RandomState(2).rand(10, 3)
+    with RemoteEvaluator(failing) as f:
+        with pytest.raises(RemoteError, match="no value"):
+            f(points)
+    with RemoteEvaluator(addresses) as f:
+        f(points)
+        assert np.array_equal(f(points), [func6(point) for point in points])    # connection reused
+    with pytest.raises(ConnectionError):
+        RemoteEvaluator([('127.0.0.1', 1)])(points)
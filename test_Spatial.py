@@ -0,0 +1,60 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from direct import Direct
+from helper import func7
+from spatial import HilbertIndex
+
+bounds7 = np.array([[-5., 10.], [0., 15.]])
+branin_minima = np.array([[-np.pi, 12.275], [np.pi, 2.275], [9.42478, 2.475]])
+
+
+@pytest.mark.parametrize('ndim,bits', [(1, 16), (2, 16), (3, 4), (5, 16)])    # 5 x 16 bits: multi-word keys
+def test_queries_match_brute_force(ndim, bits):
+    """Assert nearest, box and ball queries on points added in batches find what a linear scan finds."""
+    rng    = np.random.RandomState(ndim)
+    points = rng.rand(3000, ndim)
+    index  = HilbertIndex(ndim, bits=bits)
+    for k in range(0, len(points), 700):
+        index.add(points[k:k+700])
+    assert len(index) == len(points)
+    for x in rng.rand(10, ndim):
+        d = np.sqrt(((points - x) ** 2).sum(axis=1))
+        ids, dist = index.nearest(x, k=8)
+        assert np.allclose(dist, np.sort(d)[:8]) and np.allclose(d[ids], dist)
+        lower = x * 0.7
+        upper = lower + 0.3
+        inside = np.flatnonzero(((points >= lower) & (points <= upper)).all(axis=1))
+        assert sorted(index.box(lower, upper)) == inside.tolist()
+        ids, dist = index.ball(x, 0.15)
+        assert sorted(ids) == np.flatnonzero(d <= 0.15).tolist()
+        assert np.all(np.diff(dist) >= 0)
+
+
+def test_empty_and_duplicate_points():
+    index = HilbertIndex(2)
+    assert len(index.nearest([0.5, 0.5], k=3)[0]) == 0 and len(index.box([0., 0.], [1., 1.])) == 0
+    index.add([[0.5, 0.5]] * 3 + [[1., 1.]], ids=[7, 8, 9, 10])
+    ids, dist = index.nearest([0.5, 0.5], k=10)    # fewer points than k
+    assert sorted(ids[:3]) == [7, 8, 9] and ids[3] == 10 and np.allclose(dist[:3], 0.)
+    assert index.box([1., 1.], [1., 1.]).tolist() == [10]
+
+
+def test_branin_optima():
+    """Assert the index over the evaluated centers reports the three minima of Branin, in both modes."""
+    for params in (dict(), dict(mode='hilbert', bits=8)):
+        d = Direct(func7, bounds7, max_feval=500, max_iter=100, max_rectdiv=10000, **params)
+        with contextlib.redirect_stdout(io.StringIO()):
+            d.run(None)
+        points, f_vals = d.optima(n=3, radius=0.1)
+        assert np.allclose(f_vals, 0.397887, atol=0.01)
+        assert np.allclose(np.sort(points, axis=0), np.sort(branin_minima, axis=0), atol=0.1)
+        centers = d.g2r(d.rects.centers[:len(d.rects)]).reshape(len(d.rects), 2)
+        dist    = np.sqrt((((centers - branin_minima[1]) / d.scale) ** 2).sum(axis=1))
+        ids, near = d.nearest(branin_minima[1], k=5)
+        assert np.allclose(near, np.sort(dist)[:5])
+        inside = ((centers >= [2., 1.]) & (centers <= [4., 3.])).all(axis=1)
+        assert sorted(d.evaluated_in([2., 1.], [4., 3.])) == np.flatnonzero(inside).tolist()
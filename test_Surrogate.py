@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from direct import Direct, GlobalMin
+from helper import func2, func6, func7
+from surrogate import RBFSurrogate
+
+bounds2 = np.array([[-5., 10.], [0., 15.]])
+bounds6 = np.array([[0., 1.]] * 3)
+
+
+class Counted():
+    def __init__(self, f):
+        self.f       = f
+        self.n_calls = 0
+
+    def __call__(self, x):
+        self.n_calls += 1
+        return self.f(x)
+
+
+def test_rbf_interpolates():
+    """Assert the fit grown point by point interpolates the data, as a fit on all points at once does."""
+    points = np.random.RandomState(0).rand(30, 3)
+    values = np.array([func6(point) for point in points])
+    grown, whole = RBFSurrogate(), RBFSurrogate()
+    for k in range(0, 30, 7):
+        grown.add(points[k:k+7], values[k:k+7])
+        grown.predict(points[:1])
+    whole.add(points, values)
+    assert np.allclose(grown.predict(points), values, atol=1e-8)
+    assert np.allclose(grown.predict(points / 2), whole.predict(points / 2))
+    linear = RBFSurrogate()
+    linear.add(points, points @ [1., 2., 3.] + 4.)    # reproduced exactly by the linear tail
+    assert np.allclose(linear.predict(points / 3), points / 3 @ [1., 2., 3.] + 4.)
+
+
+def test_rbf_screen():
+    points = np.array([[0.], [0.25], [0.5], [0.75], [1.]])
+    model  = RBFSurrogate(margin=1.)
+    model.add(points[:3], (points[:3, 0] - 0.2) ** 2)
+    assert np.isnan(model.screen(points, 0.)).all()    # fewer than 2 (D + 1) points
+    model.add(points[3:], (points[3:, 0] - 0.2) ** 2)
+    screened = model.screen(np.array([[0.2], [0.9]]), 0.)
+    assert np.isnan(screened[0]) and screened[1] == pytest.approx(model.predict([[0.9]])[0])
+
+
+def test_surrogate_saves_real_evaluations():
+    """Assert screening reaches the optimum with fewer calls of f, every call counted in n_real and every
+    value not predicted the real one.
+    """
+    globalmin = GlobalMin(known=True, val=0.)
+    plain = Direct(func2, np.array([[-5., 5.], [-2., 8.]]), globalmin=globalmin)
+    plain.run(None)
+    f = Counted(func2)
+    d = Direct(f, np.array([[-5., 5.], [-2., 8.]]), globalmin=globalmin, surrogate=RBFSurrogate())
+    d.run(None)
+    assert d.TERMINATE and f.n_calls == d.n_real < plain.n_real == plain.n_feval
+    assert d.n_real < d.n_feval and d.provisional
+    n = len(d.rects)
+    for i in range(n):
+        if i not in d.provisional:
+            assert d.rects.f_vals[i] == func2(d.g2r(d.rects.centers[i]))
+    real = [i for i in range(n) if i not in d.provisional]
+    assert d.curr_opt == min(d.rects.f_vals[real].min(), min(d.partial)) == func2(d.x_at_opt)
+
+
+def test_surrogate_snapshots_and_maximization():
+    """Assert snapshots only hold real values, in the true sign, and account for every call of f."""
+    f = Counted(lambda x: -func7(x))
+    d = Direct(f, bounds2, globalmin=GlobalMin(minimize=False), max_iter=30, max_feval=400,
+               surrogate=RBFSurrogate())
+    snapshots = list(d.iterate())
+    assert sum(len(snapshot.points) for snapshot in snapshots) == f.n_calls == d.n_real < d.n_feval
+    for snapshot in snapshots:
+        assert np.array_equal(snapshot.f_vals, [-func7(point) for point in snapshot.points])
+    assert snapshots[-1].curr_opt == np.concatenate([snapshot.f_vals for snapshot in snapshots]).max()
+
+
+def test_resume_with_surrogate(tmp_path):
+    """Assert a run resumed in the middle of an iteration ends as an uninterrupted one, the model being
+    refitted in the order it was given its points and the iteration finished with its predictions.
+    """
+    path = str(tmp_path / "direct.npz")
+    reference = Direct(func6, bounds6, max_iter=100, max_feval=601, max_rectdiv=2000, surrogate=RBFSurrogate())
+    reference.run(None)
+    first = Direct(func6, bounds6, max_iter=100, max_feval=301, max_rectdiv=1000, checkpoint=path, surrogate=RBFSurrogate())
+    first.run(None)
+    assert first.provisional and first.partial and first.screened is not None
+    resumed = Direct.resume(path, func6, max_feval=601, max_rectdiv=2000, surrogate=RBFSurrogate())
+    assert (resumed.provisional, resumed.n_real, resumed.partial_fidelity) == \
+           (first.provisional, first.n_real, first.partial_fidelity)
+    resumed.run(None)
+    assert resumed.n_feval >= 601 and resumed.n_real < resumed.n_feval
+    assert resumed.curr_opt == func6(resumed.x_at_opt) <= first.curr_opt
+    n = len(reference.rects)
+    assert len(resumed.rects) == n and resumed.provisional == reference.provisional
+    assert np.array_equal(resumed.rects.f_vals[:n], reference.rects.f_vals[:n])
+    assert (resumed.n_feval, resumed.n_real, resumed.x_at_opt.tolist()) == \
+           (reference.n_feval, reference.n_real, reference.x_at_opt.tolist())